@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from app.models import Job
+from app.services.job_service import enqueue_job, job_to_dict, JOB_HANDLERS
+
+router = APIRouter()
+
+@router.post("/{kind}/{rfp_id}")
+def enqueue(kind: str, rfp_id: int, db: Session = Depends(get_db)):
+    """
+    Queues a technical, pricing, proposal or full pipeline run and returns its job id immediately.
+    """
+    if kind not in JOB_HANDLERS:
+        raise HTTPException(status_code=404, detail=f"Unknown job kind. Use one of: {', '.join(JOB_HANDLERS)}")
+
+    job = enqueue_job(kind, rfp_id, db)
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/agents/jobs/{job.id}"
+    }
+
+@router.get("/{job_id}")
+def get_job_status(job_id: int, db: Session = Depends(get_db)):
+    """
+    Poll for job status; the handler's result is included once the job finishes.
+    """
+    job = db.query(Job).filter(Job.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_to_dict(job)
@@ -1,19 +1,35 @@
 import os
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.services.proposal_service import generate_proposal_ppt, OUTPUT_DIR
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.database import get_db, get_async_db
+from app.services.proposal_service import generate_proposal_ppt, generate_proposals_bulk, benchmark_proposals, OUTPUT_DIR
 
 
 from pydantic import BaseModel
-from app.services.chat_service import chat_with_rfp
+from typing import List, Optional
+from app.models import RFP, ChatSession
+from app.services.chat_service import achat_with_rfp, stream_chat, chat_session_to_dict
+from app.services.pipeline_service import run_pipeline
+from app.services.llm_cache import get_llm_cache_stats
 
 class ChatRequest(BaseModel):
     question: str
+    session_id: Optional[str] = None # Omit to start a new conversation
+
+class BulkProposalRequest(BaseModel):
+    rfp_ids: List[int]
 
 router = APIRouter()
 
+@router.post("/bulk-generate-proposals")
+def bulk_generate_proposals(request: BulkProposalRequest, db: Session = Depends(get_db)):
+    """
+    Renders proposals for many RFPs in parallel, with throughput and per-RFP timings.
+    """
+    return generate_proposals_bulk(request.rfp_ids, db)
+
 @router.post("/{rfp_id}/generate-proposal")
 def generate_proposal(rfp_id: int, db: Session = Depends(get_db)):
     """
@@ -22,6 +38,20 @@ def generate_proposal(rfp_id: int, db: Session = Depends(get_db)):
     result = generate_proposal_ppt(rfp_id, db)
     return result
 
+@router.get("/proposals/benchmark")
+def proposal_benchmark(count: int = 20):
+    """
+    Proposals/second drawn from scratch vs filled from the cached master deck.
+    """
+    return benchmark_proposals(max(1, min(count, 500)))
+
+@router.post("/{rfp_id}/run-pipeline")
+def run_full_pipeline(rfp_id: int, checkpoint: bool = False, db: Session = Depends(get_db)):
+    """
+    Runs Technical -> Pricing -> Proposal in a single call, with per-stage timings.
+    """
+    return run_pipeline(rfp_id, db, checkpoint=checkpoint)
+
 @router.get("/download/{filename}")
 def download_proposal(filename: str):
     """
@@ -38,9 +68,42 @@ def download_proposal(filename: str):
     )
 
 @router.post("/{rfp_id}/chat")
-def ask_rfp_question(rfp_id: int, request: ChatRequest, db: Session = Depends(get_db)):
+async def ask_rfp_question(rfp_id: int, request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
     """
     Chat with the specific RFP using RAG + Structured Data.
     """
-    result = chat_with_rfp(rfp_id, request.question, db)
-    return result
\ No newline at end of file
+    result = await achat_with_rfp(rfp_id, request.question, db, session_id=request.session_id)
+    return result
+
+@router.post("/{rfp_id}/chat/stream")
+async def stream_rfp_answer(rfp_id: int, request: ChatRequest, db: AsyncSession = Depends(get_async_db)):
+    """
+    Same as /chat, but streams tokens as Server-Sent Events and ends with a "done" event.
+    """
+    rfp = await db.get(RFP, rfp_id)
+    if not rfp:
+        raise HTTPException(status_code=404, detail="RFP not found")
+
+    # Session lookup and retrieval run inside the stream, so their failures arrive as "error" events
+    return StreamingResponse(
+        stream_chat(rfp_id, request.question, session_id=request.session_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/{rfp_id}/chat/sessions/{session_id}")
+def get_chat_history(rfp_id: int, session_id: str, db: Session = Depends(get_db)):
+    """
+    Rolling summary and recent turns of a chat session.
+    """
+    session = db.query(ChatSession).filter(ChatSession.id == session_id, ChatSession.rfp_id == rfp_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Chat session not found")
+    return chat_session_to_dict(session)
+
+@router.get("/llm-cache/stats")
+def llm_cache_stats():
+    """
+    Hit ratio and latency saved by the LLM response cache.
+    """
+    return get_llm_cache_stats()
@@ -1,10 +1,24 @@
+from typing import Dict, List
 from fastapi import APIRouter, Depends
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.services.pricing_agent import calculate_pricing
+from app.services.pricing_agent import calculate_pricing, calculate_pricing_bulk
+
+class BulkPricingRequest(BaseModel):
+    rfp_ids: List[int]
+    rates: Dict[str, float] = {}
+    persist: bool = True
 
 router = APIRouter()
 
+@router.post("/bulk-calculate")
+def run_bulk_pricing(request: BulkPricingRequest, db: Session = Depends(get_db)):
+    """
+    Prices many RFPs in one pass. Set persist=false with custom rates for what-if quotes.
+    """
+    return calculate_pricing_bulk(request.rfp_ids, db, rates=request.rates, persist=request.persist)
+
 @router.post("/{rfp_id}/calculate")
 def run_pricing_logic(rfp_id: int, db: Session = Depends(get_db)):
     """
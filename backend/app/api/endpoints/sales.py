@@ -1,80 +1,181 @@
 
-import shutil
 import os
+import json
+import asyncio
 from datetime import datetime
 from fastapi import File, UploadFile, Form, HTTPException
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.services.sales_service import scan_mock_portal
-from app.models import RFP
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.config import settings
+from app.core.database import get_db, get_async_db
+from app.services.portal_crawler import scan_portals
+from app.services.pdf_service import extract_text_from_pdf, remember_file_sha256
+from app.services.sales_service import save_upload, UploadTooLarge, UPLOAD_DIR, benchmark_portal_parsing, parse_fields, rfp_list_query, rfp_counts_query, encode_cursor, page_etag
+from app.models import RFP, PortalState
 
-UPLOAD_DIR = "/app/data/manual_uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 
 
 router = APIRouter()
 
+def duplicate_upload(existing: RFP) -> dict:
+    return {
+        "status": "duplicate",
+        "message": "This file was already uploaded",
+        "rfp_id": existing.id,
+        "file_url": existing.file_url
+    }
+
+async def find_upload(sha: str, db: AsyncSession):
+    return (await db.execute(select(RFP).where(RFP.file_sha256 == sha).limit(1))).scalar_one_or_none()
+
 @router.post("/upload")
 async def upload_manual_rfp(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     title: str = Form(...),
     client: str = Form(...),
     deadline: str = Form(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Handles manual PDF uploads from the user.
+    A file that was uploaded before returns the existing RFP instead of a copy.
     """
+    # Oversized bodies are already refused by BodySizeLimitMiddleware before form parsing;
+    # this cap is on the file alone
+    max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+
     try:
         # 1. Generate a safe filename
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        safe_filename = f"manual_{timestamp}_{file.filename.replace(' ', '_')}"
+        safe_filename = f"manual_{timestamp}_{os.path.basename(file.filename).replace(' ', '_')}"
         file_path = os.path.join(UPLOAD_DIR, safe_filename)
 
-        # 2. Save file to disk
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        # 2. Copy to disk in a worker thread, hashing as it streams
+        try:
+            sha, size = await asyncio.to_thread(save_upload, file.file, file_path, max_bytes)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
 
-        # 3. Create DB Entry
+        # 3. Same content uploaded before -> keep the existing RFP
+        existing = await find_upload(sha, db)
+        if existing:
+            await asyncio.to_thread(os.remove, file_path)
+            return duplicate_upload(existing)
+
+        # 4. Create DB Entry
         new_rfp = RFP(
             title=title,
             client_name=client,
             deadline=deadline,
             file_url=file_path, # Saves the internal Docker path
+            file_sha256=sha,
             status="New",
             created_at=datetime.now()
         )
         db.add(new_rfp)
-        db.commit()
-        db.refresh(new_rfp)
+        try:
+            await db.commit()
+        except IntegrityError:
+            # The same file was uploaded concurrently and won the unique index
+            await db.rollback()
+            existing = await find_upload(sha, db)
+            if existing is None:
+                raise
+            await asyncio.to_thread(os.remove, file_path)
+            return duplicate_upload(existing)
+
+        # 5. Warm the text cache so the first analysis or chat does not parse the PDF
+        remember_file_sha256(file_path, sha)
+        background_tasks.add_task(extract_text_from_pdf, file_path)
 
         return {
             "status": "success",
             "message": "RFP Uploaded Successfully",
             "rfp_id": new_rfp.id,
-            "file_url": file_path
+            "file_url": file_path,
+            "size_bytes": size
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 @router.post("/scan")
-def trigger_scan(db: Session = Depends(get_db)):
+async def trigger_scan(force: bool = False):
     """
-    Triggers the Sales Agent to scan the portal and save new RFPs.
+    Triggers the Sales Agent to scan every configured portal and save new RFPs.
+    Unchanged pages are skipped unless force=true.
     """
-    result = scan_mock_portal(db)
-    return result
+    return await scan_portals(force=force)
+
+@router.get("/scan/benchmark")
+def scan_benchmark(tenders: int = Query(10000, ge=1, le=100000)):
+    """
+    Portal parsing throughput on a synthetic page, per parser.
+    """
+    return benchmark_portal_parsing(tenders)
 
 @router.get("/rfps")
-def list_rfps(db: Session = Depends(get_db)):
+async def list_rfps(
+    request: Request,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    client: Optional[str] = None,
+    deadline_from: Optional[str] = None,
+    deadline_to: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    List RFPs newest first, one page at a time.
+    extracted_data is left out unless requested via `fields`. The next page's
+    cursor is in the X-Next-Cursor header; an unchanged page returns 304.
+    """
+    try:
+        columns = parse_fields(fields)
+        query = rfp_list_query(columns, limit, cursor, status, client, deadline_from, deadline_to)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    rows = (await db.execute(query)).all()
+    page = rows[:limit]
+    headers = {"Cache-Control": "no-cache"}
+    if len(rows) > limit:
+        headers["X-Next-Cursor"] = encode_cursor(page[-1].created_at, page[-1].id)
+
+    payload = json.dumps(jsonable_encoder([dict(r._mapping) for r in page]), separators=(",", ":")).encode("utf-8")
+    headers["ETag"] = page_etag(payload + headers.get("X-Next-Cursor", "").encode("ascii"))
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload, media_type="application/json", headers=headers)
+
+@router.get("/rfps/counts")
+async def count_rfps(db: AsyncSession = Depends(get_async_db)):
+    """
+    RFP totals per status, for dashboards that only load one page of the list.
+    """
+    by_status = {status: count for status, count in (await db.execute(rfp_counts_query())).all()}
+    return {"total": sum(by_status.values()), "by_status": by_status}
+
+@router.get("/rfps/{rfp_id}")
+async def get_rfp(rfp_id: int, db: AsyncSession = Depends(get_async_db)):
     """
-    List all RFPs in the database.
+    One RFP with all columns, including extracted_data.
     """
-    rfps = db.query(RFP).all()
-    return rfps
+    rfp = await db.get(RFP, rfp_id)
+    if not rfp:
+        raise HTTPException(status_code=404, detail="RFP not found")
+    return rfp
 
 
 @router.delete("/reset")
@@ -82,6 +183,8 @@ def reset_pipeline(db: Session = Depends(get_db)):
     
     try:
         num_deleted = db.query(RFP).delete()
+        # Forget portal fingerprints too, or the next scan would skip the unchanged pages
+        db.query(PortalState).delete()
         db.commit()
         return {"status": "success", "deleted_count": num_deleted, "message": "Pipeline cleared"}
     except Exception as e:
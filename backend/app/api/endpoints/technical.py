@@ -1,14 +1,54 @@
-from fastapi import APIRouter, Depends
+import os
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.services.technical_agent import analyze_rfp_technical
+from app.models import RFP
+from app.services.technical_agent import analyze_rfp_technical, analyze_rfps_bulk
+from app.services.catalog_index import evaluate_recall, benchmark_shortlist
+from app.services.pdf_service import benchmark_pdf_extraction
+
+class BulkAnalyzeRequest(BaseModel):
+    rfp_ids: List[int]
 
 router = APIRouter()
 
+@router.post("/bulk-analyze")
+def run_bulk_technical_analysis(request: BulkAnalyzeRequest, db: Session = Depends(get_db)):
+    """
+    Analyzes many RFPs together, matching each distinct requirement only once.
+    """
+    return analyze_rfps_bulk(request.rfp_ids, db)
+
 @router.post("/{rfp_id}/analyze")
 def run_technical_analysis(rfp_id: int, db: Session = Depends(get_db)):
     """
     Triggers the AI to read PDF -> Extract Specs -> Match Product
     """
     result = analyze_rfp_technical(rfp_id, db)
-    return result
\ No newline at end of file
+    return result
+
+@router.get("/catalog-index/recall")
+def catalog_index_recall(db: Session = Depends(get_db)):
+    """
+    Recall@k of the catalog pre-filter against past full-catalog matches.
+    """
+    return evaluate_recall(db)
+
+@router.get("/catalog-index/benchmark")
+def catalog_index_benchmark():
+    """
+    Offline top-k shortlist vs full catalog on the seeded products: recall and prompt size.
+    """
+    return benchmark_shortlist()
+
+@router.get("/{rfp_id}/pdf-benchmark")
+def pdf_extraction_benchmark(rfp_id: int, runs: int = Query(3, ge=1, le=10), db: Session = Depends(get_db)):
+    """
+    Serial vs parallel text extraction of this RFP's PDF.
+    """
+    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
+    if not rfp or not rfp.file_url or not os.path.isfile(rfp.file_url):
+        raise HTTPException(status_code=404, detail="RFP document not found")
+    return benchmark_pdf_extraction(rfp.file_url, runs)
@@ -0,0 +1,52 @@
+import json
+from fastapi import HTTPException
+
+# Multipart framing and the other form fields add a little on top of the file itself
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class BodySizeLimitMiddleware:
+    """
+    Caps request bodies on the given paths before any form parsing.
+    A declared Content-Length over the limit is answered with 413 without reading
+    the body; otherwise the body is counted as it arrives and the request fails
+    with 413 as soon as it passes the limit, so an oversized upload is never
+    spooled in full.
+    """
+
+    def __init__(self, app, paths: tuple, max_bytes: int):
+        self.app = app
+        self.paths = set(paths)
+        self.max_bytes = max_bytes + FORM_OVERHEAD_BYTES
+        self.detail = f"File exceeds {max_bytes // (1024 * 1024)} MB"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            return await self.app(scope, receive, send)
+
+        declared = dict(scope["headers"]).get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            return await self.reject(send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside the form parser; FastAPI re-raises HTTPExceptions as-is
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def reject(self, send):
+        body = json.dumps({"detail": self.detail}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()), (b"connection", b"close")],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -8,12 +8,70 @@ class Settings(BaseSettings):
     POSTGRES_PORT: str = "5432"
     POSTGRES_DB: str
     GOOGLE_API_KEY: str
+
+    # Connection pool, applied to both the sync and the async engine
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+
+    # Technical agent: requirements per batched matching call (1 = one call per item)
+    MATCH_BATCH_SIZE: int = 10
+    # Concurrent matching calls in flight, per-call timeout and retry/backoff policy
+    MATCH_CONCURRENCY: int = 5
+    MATCH_TIMEOUT_SECONDS: float = 60.0
+    MATCH_MAX_RETRIES: int = 2
+    MATCH_BACKOFF_SECONDS: float = 1.0
+    # Products retrieved per requirement by the local TF-IDF pre-filter (0 = send full catalog)
+    CATALOG_TOP_K: int = 8
+
+    # Chat: RFP excerpts retrieved per question by the local BM25 index
+    CHAT_TOP_K: int = 6
+    # Chat sessions: older turns are summarized once recent history exceeds the token budget
+    CHAT_HISTORY_TOKEN_BUDGET: int = 1500
+    CHAT_KEEP_TURNS: int = 2
+    # Chat model: "gemini" or "fake" (local stub with a canned streamed answer, for tests)
+    CHAT_LLM_PROVIDER: str = "gemini"
+    CHAT_FAKE_RESPONSE: str = "This is a stubbed answer from the local test model."
+
+    # Manual uploads larger than this are rejected
+    MAX_UPLOAD_MB: int = 50
+
+    # Sales agent: BeautifulSoup parser for portal pages ("lxml" falls back to "html.parser" if not installed)
+    PORTAL_PARSER: str = "lxml"
+    # Portals to crawl (JSON list in the environment); "adapter" picks the parser in portal_crawler.ADAPTERS
+    PORTAL_SOURCES: list = [{"name": "mock_portal", "url": "/app/data/mock_portal.html", "adapter": "tender_list"}]
+    PORTAL_MAX_PAGES: int = 50
+    PORTAL_PER_HOST_CONCURRENCY: int = 4
+    PORTAL_FETCH_TIMEOUT_SECONDS: float = 30.0
+    # Periodic background crawl (0 = only on POST /sales/scan)
+    PORTAL_SCAN_INTERVAL_SECONDS: int = 0
+
+    # Pricing agent: "longest" (most specific service wins) or "first" (original rate-card order)
+    RATE_CARD_MATCH_MODE: str = "longest"
+
+    # Bulk proposal rendering processes (0 = one per CPU)
+    PROPOSAL_WORKERS: int = 0
+
+    # Background jobs: number of workers and "thread" or "process" executor
+    JOB_WORKERS: int = 4
+    JOB_EXECUTOR: str = "thread"
+
+    # LLM response cache (applies to temperature-0 calls unless LLM_CACHE_ALL_TEMPERATURES)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_ALL_TEMPERATURES: bool = False
+    LLM_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    LLM_CACHE_MAX_ENTRIES: int = 50000
     
     # Constructed Database URL
     @property
     def DATABASE_URL(self) -> str:
         return f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}@{self.POSTGRES_SERVER}:{self.POSTGRES_PORT}/{self.POSTGRES_DB}"
 
+    @property
+    def ASYNC_DATABASE_URL(self) -> str:
+        return self.DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
     class Config:
         env_file = ".env"
 
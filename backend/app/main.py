@@ -1,24 +1,56 @@
 from fastapi import FastAPI
+from sqlalchemy import text
 from fastapi.middleware.cors import CORSMiddleware
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.body_limit import BodySizeLimitMiddleware
+from app.core.database import engine, async_engine, Base
 from app.api.endpoints import sales 
 from app.services.seed_db import seed_products
 from app.core.database import SessionLocal
-from app.api.endpoints import sales, technical, pricing, main_agent
+from app.api.endpoints import sales, technical, pricing, main_agent, jobs
+from app.services.job_service import recover_jobs, shutdown_jobs
+from app.services.proposal_service import shutdown_proposal_pool
+from app.services.pdf_service import shutdown_pdf_pool
+from app.services.portal_crawler import start_scheduler, stop_scheduler
 
 
 
 Base.metadata.create_all(bind=engine)
+# create_all skips existing tables, so columns and indexes added to them later are created here
+with engine.begin() as conn:
+    conn.execute(text("ALTER TABLE rfps ADD COLUMN IF NOT EXISTS tender_key VARCHAR"))
+    conn.execute(text("ALTER TABLE rfps ADD COLUMN IF NOT EXISTS content_hash VARCHAR"))
+    conn.execute(text("ALTER TABLE rfps ADD COLUMN IF NOT EXISTS file_sha256 VARCHAR"))
+    conn.execute(text("ALTER TABLE rfps ADD COLUMN IF NOT EXISTS source_url VARCHAR"))
+    conn.execute(text("ALTER TABLE portal_state ADD COLUMN IF NOT EXISTS next_url VARCHAR"))
+    # file_sha256 became unique: drop the old plain index and clear the hash on any
+    # duplicate uploads left by earlier races (the oldest RFP keeps it)
+    conn.execute(text("DROP INDEX IF EXISTS ix_rfps_file_sha256"))
+    conn.execute(text(
+        "UPDATE rfps SET file_sha256 = NULL WHERE id IN ("
+        "SELECT id FROM (SELECT id, row_number() OVER (PARTITION BY file_sha256 ORDER BY id) AS n "
+        "FROM rfps WHERE file_sha256 IS NOT NULL) d WHERE n > 1)"
+    ))
+for table in Base.metadata.sorted_tables:
+    for index in table.indexes:
+        index.create(bind=engine, checkfirst=True)
 
 app = FastAPI(title=settings.PROJECT_NAME)
 
 
+# Added before CORS so that CORS wraps it and 413 responses still carry CORS headers
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    paths=("/api/agents/sales/upload",),
+    max_bytes=settings.MAX_UPLOAD_MB * 1024 * 1024,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 
@@ -31,14 +63,29 @@ app.include_router(pricing.router, prefix="/api/agents/pricing", tags=["Pricing
 
 app.include_router(main_agent.router, prefix="/api/agents/main", tags=["Main Agent"])
 
+app.include_router(jobs.router, prefix="/api/agents/jobs", tags=["Jobs"])
+
 @app.on_event("startup")
 def startup_event():
     db = SessionLocal()
     try:
         seed_products(db)
+        recover_jobs(db)
     finally:
         db.close()
 
+@app.on_event("startup")
+async def start_background_scans():
+    start_scheduler()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_scheduler()
+    shutdown_jobs()
+    shutdown_proposal_pool()
+    shutdown_pdf_pool()
+    await async_engine.dispose()
+
 @app.get("/")
 def read_root():
     return {"message": "BidWin AI API Ready"}
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text, Float, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.core.database import Base
 
@@ -7,15 +7,25 @@ class RFP(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
-    client_name = Column(String)
+    tender_key = Column(String, unique=True, index=True, nullable=True) # "<source>:<portal id>" for scanned tenders
+    content_hash = Column(String, nullable=True) # Hash of the portal listing, to detect modified tenders
+    client_name = Column(String, index=True)
     file_url = Column(String) # Path to the PDF
-    status = Column(String, default="New") # New, In Progress, Ready, Submitted
+    source_url = Column(String, nullable=True) # Portal URL of the PDF, for tenders from remote portals (file_url is the downloaded copy)
+    file_sha256 = Column(String, nullable=True) # Set for uploads, to return the existing RFP for a re-uploaded file (unique)
+    status = Column(String, default="New", index=True) # New, In Progress, Ready, Submitted
     deadline = Column(String)
     
     extracted_data = Column(JSON, nullable=True) 
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    # Keyset pagination of the RFP list walks (created_at, id) newest first
+    __table_args__ = (
+        Index("ix_rfps_created_at_id", "created_at", "id"),
+        Index("ux_rfps_file_sha256", "file_sha256", unique=True),
+    )
+
 class Product(Base):
     __tablename__ = "products"
 
@@ -25,4 +35,60 @@ class Product(Base):
     description = Column(Text)
     base_price = Column(Float)
     
-    specs = Column(JSON)
\ No newline at end of file
+    specs = Column(JSON)
+
+class ProductIndex(Base):
+    """Pre-tokenized product text used by the local catalog retrieval index."""
+    __tablename__ = "product_index"
+
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), primary_key=True)
+    text_hash = Column(String) # Hash of the indexed text, to detect edited products
+    term_counts = Column(JSON)
+
+class RFPChunkIndex(Base):
+    """Chunked full text of an RFP, used for retrieval in chat."""
+    __tablename__ = "rfp_chunk_index"
+
+    rfp_id = Column(Integer, ForeignKey("rfps.id", ondelete="CASCADE"), primary_key=True)
+    file_sha256 = Column(String) # Hash of the chunked PDF, to detect replaced files
+    chunks = Column(JSON)
+
+class ChatSession(Base):
+    """Server-side chat memory: a rolling summary plus the most recent turns."""
+    __tablename__ = "chat_sessions"
+
+    id = Column(String, primary_key=True) # Client-visible session id
+    rfp_id = Column(Integer, ForeignKey("rfps.id", ondelete="CASCADE"), index=True)
+    analysis = Column(Text) # Compact analysis JSON, built once per session
+    summary = Column(Text, default="")
+    turns = Column(JSON, default=list) # [{"question", "answer"}] not yet folded into the summary
+    turn_count = Column(Integer, default=0)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class PortalState(Base):
+    """Fingerprint of the last scanned version of a tender portal page."""
+    __tablename__ = "portal_state"
+
+    source = Column(String, primary_key=True) # "<source name>|<page url>"
+    content_sha256 = Column(String)
+    next_url = Column(String, nullable=True) # Followed without refetching when the page is not modified
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True) # Last-Modified header, or "mtime_ns:size" for local files
+    tender_count = Column(Integer, default=0)
+    scanned_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String) # technical, pricing, proposal, pipeline
+    rfp_id = Column(Integer, index=True)
+    status = Column(String, default="Queued", index=True) # Queued, Running, Done, Failed
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,112 @@
+import time
+import threading
+from dataclasses import dataclass
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.models import Product
+from app.services.catalog_index import KeywordIndex, build_catalog_index, format_catalog
+
+# Safety net for catalog writes made by other processes, which the
+# in-process version counter cannot see
+CATALOG_CACHE_TTL_SECONDS = 300
+
+_lock = threading.Lock()
+_version = 0
+_snapshot = None
+
+
+@dataclass(frozen=True)
+class ProductRecord:
+    """Detached, read-only copy of a Product row, safe to share across requests and threads."""
+    id: int
+    sku: str
+    name: str
+    description: str
+    base_price: float
+    specs: dict
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the product catalog at one catalog version: the products,
+    an id -> product dict and the serialized catalog string used in prompts.
+    Search indexes are built lazily, once per snapshot.
+    """
+
+    def __init__(self, products: list, version: int):
+        self.products = tuple(products)
+        self.by_id = {p.id: p for p in self.products}
+        self.catalog_str = format_catalog(self.products)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._index_lock = threading.Lock()
+        self._keyword_index = None
+        self._search_index = None
+
+    def keyword_index(self) -> KeywordIndex:
+        with self._index_lock:
+            if self._keyword_index is None:
+                self._keyword_index = KeywordIndex(self.products)
+            return self._keyword_index
+
+    def search_index(self, db: Session):
+        with self._index_lock:
+            if self._search_index is None:
+                self._search_index = build_catalog_index(db, self.products)
+            return self._search_index
+
+
+def invalidate_catalog():
+    global _version
+    with _lock:
+        _version += 1
+
+
+def get_catalog_snapshot(db: Session) -> CatalogSnapshot:
+    global _snapshot
+    with _lock:
+        snapshot = _snapshot
+        version = _version
+    if (
+        snapshot is not None
+        and snapshot.version == version
+        and time.monotonic() - snapshot.loaded_at < CATALOG_CACHE_TTL_SECONDS
+    ):
+        return snapshot
+
+    products = [
+        ProductRecord(
+            id=p.id,
+            sku=p.sku,
+            name=p.name,
+            description=p.description,
+            base_price=p.base_price,
+            specs=dict(p.specs or {}),
+        )
+        for p in db.query(Product).order_by(Product.id).all()
+    ]
+    snapshot = CatalogSnapshot(products, version)
+    with _lock:
+        # Don't replace a snapshot taken at a newer version by a concurrent caller
+        if _snapshot is None or _snapshot.version <= version:
+            _snapshot = snapshot
+    return snapshot
+
+
+@event.listens_for(Session, "after_flush")
+def _track_product_writes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Product):
+            session.info["catalog_changed"] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("catalog_changed", False):
+        invalidate_catalog()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("catalog_changed", None)
@@ -0,0 +1,234 @@
+import re
+import math
+import hashlib
+from collections import Counter
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from app.models import RFP, Product, ProductIndex
+from app.services.seed_db import seed_catalog, SEED_REQUIREMENTS
+
+# Words that carry no signal when comparing requirements to products
+STOPWORDS = {
+    "a", "an", "and", "as", "at", "by", "for", "from", "in", "is", "of", "on",
+    "or", "the", "to", "up", "with", "none",
+}
+
+
+def keyword_tokens(text) -> set:
+    return set(re.findall(r'\w+', str(text).lower()))
+
+
+def tokenize(text) -> list:
+    return [t for t in re.findall(r'\w+', str(text).lower()) if t not in STOPWORDS]
+
+
+def product_text(product) -> str:
+    return f"{product.name} {product.description} {str(product.specs)}"
+
+
+def requirement_text(item) -> str:
+    if isinstance(item, dict):
+        return f"{item.get('item_name')} {item.get('specs')}"
+    return str(item)
+
+
+def format_catalog(products) -> str:
+    return "\n".join([f"ID:{p.id}|Name:{p.name}|Desc:{p.description}|Specs:{p.specs}" for p in products])
+
+
+class TfidfIndex:
+    """
+    Sparse TF-IDF vectors over product text with an inverted index,
+    so a query only touches products sharing at least one term with it.
+    """
+
+    def __init__(self, term_counts_by_product: dict):
+        self.product_ids = list(term_counts_by_product.keys())
+        doc_count = len(self.product_ids)
+
+        doc_freq = Counter()
+        for counts in term_counts_by_product.values():
+            doc_freq.update(counts.keys())
+        self.idf = {term: math.log((1 + doc_count) / (1 + df)) + 1 for term, df in doc_freq.items()}
+
+        self.postings = {}
+        for product_id, counts in term_counts_by_product.items():
+            weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in counts.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for term, w in weights.items():
+                self.postings.setdefault(term, []).append((product_id, w / norm))
+
+    def search(self, query: str, k: int) -> list:
+        """Returns [(product_id, cosine_score)] for the top-k products."""
+        counts = Counter(t for t in tokenize(query) if t in self.idf)
+        if not counts:
+            return []
+
+        weights = {term: (1 + math.log(tf)) * self.idf[term] for term, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+
+        scores = Counter()
+        for term, w in weights.items():
+            q = w / norm
+            for product_id, pw in self.postings[term]:
+                scores[product_id] += q * pw
+        return scores.most_common(k)
+
+
+class KeywordIndex:
+    """
+    Normalized token sets per product plus an inverted index, so one requirement can
+    be keyword-scored against the whole catalog in a single pass over its own tokens.
+    Scores are the share of requirement tokens found in the product text (0-100).
+    """
+
+    def __init__(self, products: list):
+        self.product_ids = [p.id for p in products]
+        self.tokens = {p.id: keyword_tokens(product_text(p)) for p in products}
+        self.postings = {}
+        for product_id, tokens in self.tokens.items():
+            for token in tokens:
+                self.postings.setdefault(token, []).append(product_id)
+
+    def score_all(self, req_text: str) -> dict:
+        """Returns {product_id: score 0-100} for every product."""
+        req_tokens = keyword_tokens(req_text)
+        scores = dict.fromkeys(self.product_ids, 0)
+        if not req_tokens:
+            return scores
+
+        overlap = Counter()
+        for token in req_tokens:
+            overlap.update(self.postings.get(token, ()))
+        for product_id, shared in overlap.items():
+            scores[product_id] = min(int((shared / len(req_tokens)) * 100), 100)
+        return scores
+
+
+def sync_product_index(db: Session, products: list) -> dict:
+    """
+    Brings the persisted product_index table in line with the catalog and
+    returns {product_id: term_counts}. Only new or edited products are re-tokenized.
+    Writes are an upsert plus a delete in the caller's transaction; the caller commits.
+    """
+    existing = {
+        row.product_id: row
+        for row in db.execute(select(ProductIndex.product_id, ProductIndex.text_hash, ProductIndex.term_counts))
+    }
+    term_counts_by_product = {}
+    changed = []
+
+    for product in products:
+        text = product_text(product)
+        text_hash = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        row = existing.pop(product.id, None)
+
+        if row is None or row.text_hash != text_hash:
+            counts = dict(Counter(tokenize(text)))
+            changed.append({"product_id": product.id, "text_hash": text_hash, "term_counts": counts})
+        else:
+            counts = row.term_counts
+
+        term_counts_by_product[product.id] = counts
+
+    if changed:
+        # Concurrent first requests may index the same products; the upsert makes that harmless
+        stmt = pg_insert(ProductIndex).values(changed)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[ProductIndex.product_id],
+            set_={"text_hash": stmt.excluded.text_hash, "term_counts": stmt.excluded.term_counts}
+        ))
+    if existing:
+        db.execute(delete(ProductIndex).where(ProductIndex.product_id.in_(list(existing))))
+    return term_counts_by_product
+
+
+def build_catalog_index(db: Session, products: list) -> TfidfIndex:
+    return TfidfIndex(sync_product_index(db, products))
+
+
+def candidate_products(index: TfidfIndex, products_by_id: dict, items: list, k: int) -> list:
+    """
+    Union of the top-k products for each requirement, in catalog order.
+    Falls back to the full catalog when nothing in the requirements is indexed.
+    """
+    candidate_ids = set()
+    for item in items:
+        candidate_ids.update(pid for pid, _ in index.search(requirement_text(item), k))
+    if not candidate_ids:
+        return list(products_by_id.values())
+    return [p for pid, p in products_by_id.items() if pid in candidate_ids]
+
+
+def evaluate_recall(db: Session, ks=(1, 3, 5, 8, 10)) -> dict:
+    """
+    Recall@k of the TF-IDF pre-filter, using matches already stored on analysed RFPs
+    (produced by full-catalog LLM matching) as ground truth.
+    """
+    products = db.query(Product).all()
+    index = build_catalog_index(db, products)
+    max_k = max(ks)
+
+    samples = 0
+    hits = {k: 0 for k in ks}
+    for rfp in db.query(RFP).filter(RFP.extracted_data.isnot(None)).all():
+        data = rfp.extracted_data or {}
+        if data.get("catalog_top_k"):
+            # Matched against a pre-filtered catalog, so not an independent reference
+            continue
+        for line in data.get("line_items", []):
+            match = line.get("match")
+            if not match:
+                continue
+            ranked = [pid for pid, _ in index.search(requirement_text(line.get("requirement")), max_k)]
+            samples += 1
+            for k in ks:
+                if match.get("product_id") in ranked[:k]:
+                    hits[k] += 1
+
+    return {
+        "samples": samples,
+        "catalog_size": len(products),
+        "recall": {f"@{k}": round(hits[k] / samples, 3) if samples else None for k in ks}
+    }
+
+
+def benchmark_shortlist(ks=(1, 3, 5, 8, 10)) -> dict:
+    """
+    Offline comparison of full-catalog matching with the top-k shortlist on the
+    seeded catalog: recall@k against the labelled seed requirements (the product
+    a full-catalog match should pick) and the catalog tokens sent per requirement.
+    No database or LLM is involved.
+    """
+    products = seed_catalog()
+    for i, product in enumerate(products, start=1):
+        product.id = i
+    by_sku = {p.sku: p for p in products}
+    by_id = {p.id: p for p in products}
+    index = TfidfIndex({p.id: Counter(tokenize(product_text(p))) for p in products})
+    full_tokens = len(format_catalog(products)) // 4
+
+    results = {}
+    for k in ks:
+        hits, shortlist_tokens, misses = 0, 0, []
+        for sku, requirement in SEED_REQUIREMENTS:
+            shortlist = candidate_products(index, by_id, [requirement], k)
+            shortlist_tokens += len(format_catalog(shortlist)) // 4
+            if by_sku[sku] in shortlist:
+                hits += 1
+            else:
+                misses.append(sku)
+        results[f"@{k}"] = {
+            "recall": round(hits / len(SEED_REQUIREMENTS), 3),
+            "catalog_tokens_per_item": round(shortlist_tokens / len(SEED_REQUIREMENTS), 1),
+            "token_reduction": round(1 - shortlist_tokens / (full_tokens * len(SEED_REQUIREMENTS)), 3),
+            "missed_skus": misses,
+        }
+
+    return {
+        "samples": len(SEED_REQUIREMENTS),
+        "catalog_size": len(products),
+        "full_catalog_tokens_per_item": full_tokens,
+        "shortlist": results,
+    }
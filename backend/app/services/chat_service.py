@@ -1,53 +1,285 @@
+import json
+import time
+import uuid
 from sqlalchemy.orm import Session
-from app.models import RFP
-from app.services.pdf_service import extract_text_from_pdf
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import RFP, ChatSession
+from app.core.database import AsyncSessionLocal
+from app.services.rag_service import retrieve_context, aretrieve_context
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
 from langchain.prompts import ChatPromptTemplate
 from app.core.config import settings
+from app.services.llm_cache import cached_invoke, cached_ainvoke
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    google_api_key=settings.GOOGLE_API_KEY,
-    temperature=0.3, 
-    convert_system_message_to_human=True
-)
+def build_chat_llm(provider: str):
+    """
+    "gemini" for the real model, "fake" for a local stub that streams a canned
+    answer character by character (no API key or network needed).
+    """
+    if provider == "fake":
+        return FakeListChatModel(responses=[settings.CHAT_FAKE_RESPONSE], sleep=0.01)
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        google_api_key=settings.GOOGLE_API_KEY,
+        temperature=0.3,
+        convert_system_message_to_human=True
+    )
 
-def chat_with_rfp(rfp_id: int, user_question: str, db: Session):
+llm = build_chat_llm(settings.CHAT_LLM_PROVIDER)
+
+prompt = ChatPromptTemplate.from_messages([
+    ("system", """You are BidWin AI, an expert tender analyst.
+    You have access to excerpts of the Tender Document (PDF) relevant to the question and the Internal Analysis (JSON).
+
+    Answer the user's question accurately.
+    - If asking about specs/clauses, cite the PDF text.
+    - If asking about pricing/profit/matches, use the Internal Analysis JSON.
+    - Use the conversation so far to resolve follow-up questions.
+    - Keep answers concise and professional.
+    """),
+    ("human", """
+    --- INTERNAL ANALYSIS (JSON) ---
+    {analysis}
+
+    --- PDF DOCUMENT EXCERPTS ---
+    {pdf_text}
+
+    --- CONVERSATION SO FAR ---
+    {history}
+
+    --- USER QUESTION ---
+    {question}
+    """)
+])
+
+summary_prompt = ChatPromptTemplate.from_messages([
+    ("system", """Maintain a running summary of a conversation about a tender.
+    Merge the new turns into the existing summary. Keep facts, figures, clause references
+    and open questions; drop pleasantries. Stay under 150 words."""),
+    ("human", "Existing summary:\n{summary}\n\nNew turns:\n{turns}")
+])
+
+def estimate_tokens(text: str) -> int:
+    # Rough heuristic (~4 characters per token)
+    return len(text) // 4
+
+def format_turns(turns: list) -> str:
+    return "\n".join(f"User: {t['question']}\nAssistant: {t['answer']}" for t in turns)
+
+def format_history(session: ChatSession) -> str:
+    if session is None or (not session.summary and not session.turns):
+        return "(none)"
+    parts = []
+    if session.summary:
+        parts.append(f"Summary of earlier turns: {session.summary}")
+    if session.turns:
+        parts.append(format_turns(session.turns))
+    return "\n".join(parts)
+
+def compact_analysis(rfp) -> str:
+    return json.dumps(rfp.extracted_data or {}, separators=(",", ":"), default=str)
+
+def refresh_analysis(session: ChatSession, rfp) -> bool:
+    """Re-snapshots the analysis if it was re-run since the session started; True if it changed."""
+    analysis = compact_analysis(rfp)
+    if session.analysis == analysis:
+        return False
+    session.analysis = analysis
+    return True
+
+def new_chat_session(rfp, session_id: str = None) -> ChatSession:
+    # The compact analysis JSON is stored with the session and reused by every turn
+    return ChatSession(
+        id=session_id or uuid.uuid4().hex,
+        rfp_id=rfp.id,
+        analysis=compact_analysis(rfp),
+        summary="",
+        turns=[],
+        turn_count=0
+    )
+
+def get_chat_session(rfp, session_id: str, db: Session) -> ChatSession:
+    """
+    The session for this RFP, created on first use.
+    """
+    if session_id:
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if session and session.rfp_id == rfp.id:
+            if refresh_analysis(session, rfp): db.commit()
+            return session
+        # Ids are global; one belonging to another RFP starts a fresh session
+        if session: session_id = None
+
+    session = new_chat_session(rfp, session_id)
+    db.add(session)
+    db.commit()
+    return session
+
+async def aget_chat_session(rfp, session_id: str, db: AsyncSession) -> ChatSession:
+    if session_id:
+        session = await db.get(ChatSession, session_id)
+        if session and session.rfp_id == rfp.id:
+            if refresh_analysis(session, rfp): await db.commit()
+            return session
+        if session: session_id = None
+
+    session = new_chat_session(rfp, session_id)
+    db.add(session)
+    await db.commit()
+    return session
+
+def retrieval_query(user_question: str, session: ChatSession = None) -> str:
+    # Follow-ups ("and its voltage?") retrieve better with the previous question attached
+    if session and session.turns:
+        return f"{session.turns[-1]['question']} {user_question}"
+    return user_question
+
+def chat_inputs(rfp, user_question: str, pdf_text: str, session: ChatSession = None) -> dict:
+    return {
+        "analysis": session.analysis if session else str(rfp.extracted_data or {}),
+        "pdf_text": pdf_text,
+        "history": format_history(session),
+        "question": user_question
+    }
+
+def build_chat_inputs(rfp, user_question: str, db: Session, session: ChatSession = None) -> dict:
+    pdf_text = retrieve_context(rfp, retrieval_query(user_question, session), db, settings.CHAT_TOP_K)
+    return chat_inputs(rfp, user_question, pdf_text, session)
+
+async def abuild_chat_inputs(rfp, user_question: str, db: AsyncSession, session: ChatSession = None) -> dict:
+    pdf_text = await aretrieve_context(rfp, retrieval_query(user_question, session), db, settings.CHAT_TOP_K)
+    return chat_inputs(rfp, user_question, pdf_text, session)
+
+def split_turns(session: ChatSession, question: str, answer: str) -> tuple:
+    """
+    Appends a turn and returns (turns to fold into the summary, turns to keep).
+    Nothing is folded until the unsummarized turns exceed the token budget;
+    then all but the last CHAT_KEEP_TURNS are.
+    """
+    turns = list(session.turns or []) + [{"question": question, "answer": answer}]
+    keep = max(0, settings.CHAT_KEEP_TURNS)
+    if estimate_tokens(format_turns(turns)) > settings.CHAT_HISTORY_TOKEN_BUDGET and len(turns) > keep:
+        return turns[:len(turns) - keep], turns[len(turns) - keep:]
+    return [], turns
+
+def summary_inputs(session: ChatSession, old: list) -> dict:
+    return {"summary": session.summary or "(none)", "turns": format_turns(old)}
+
+def record_turn(session: ChatSession, question: str, answer: str, db: Session):
+    old, turns = split_turns(session, question, answer)
+    if old:
+        try:
+            session.summary = cached_invoke(summary_prompt, llm, summary_inputs(session, old)).content.strip()
+        except Exception:
+            # Keep the turns rather than lose them; summarization is retried next turn
+            turns = old + turns
+
+    session.turns = turns
+    session.turn_count = (session.turn_count or 0) + 1
+    db.commit()
+
+async def arecord_turn(session: ChatSession, question: str, answer: str, db: AsyncSession):
+    old, turns = split_turns(session, question, answer)
+    if old:
+        try:
+            response = await cached_ainvoke(summary_prompt, llm, summary_inputs(session, old))
+            session.summary = response.content.strip()
+        except Exception:
+            turns = old + turns
+
+    session.turns = turns
+    session.turn_count = (session.turn_count or 0) + 1
+    await db.commit()
+
+def chat_session_to_dict(session: ChatSession) -> dict:
+    return {
+        "session_id": session.id,
+        "rfp_id": session.rfp_id,
+        "turn_count": session.turn_count,
+        "summary": session.summary,
+        "recent_turns": session.turns,
+    }
+
+def chat_with_rfp(rfp_id: int, user_question: str, db: Session, session_id: str = None):
     rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
     if not rfp: return {"error": "RFP not found"}
 
-    pdf_text = extract_text_from_pdf(rfp.file_url)
-    
-    analysis_json = rfp.extracted_data or {}
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are BidWin AI, an expert tender analyst. 
-        You have access to the Tender Document (PDF) and the Internal Analysis (JSON).
-        
-        Answer the user's question accurately.
-        - If asking about specs/clauses, cite the PDF text.
-        - If asking about pricing/profit/matches, use the Internal Analysis JSON.
-        - Keep answers concise and professional.
-        """),
-        ("human", """
-        --- INTERNAL ANALYSIS (JSON) ---
-        {analysis}
-        
-        --- PDF DOCUMENT EXCERPT ---
-        {pdf_text}
-        
-        --- USER QUESTION ---
-        {question}
-        """)
-    ])
+    try:
+        session = get_chat_session(rfp, session_id, db)
+        inputs = build_chat_inputs(rfp, user_question, db, session)
+        response = cached_invoke(prompt, llm, inputs)
+        record_turn(session, user_question, response.content, db)
+        return {
+            "response": response.content,
+            "session_id": session.id,
+            "prompt_tokens_est": estimate_tokens("".join(inputs.values()))
+        }
+    except Exception as e:
+        return {"error": f"Chat failed: {str(e)}"}
+
+async def achat_with_rfp(rfp_id: int, user_question: str, db: AsyncSession, session_id: str = None):
+    """Async counterpart of chat_with_rfp for the async engine."""
+    rfp = await db.get(RFP, rfp_id)
+    if not rfp: return {"error": "RFP not found"}
 
     try:
-        chain = prompt | llm
-        response = chain.invoke({
-            "analysis": str(analysis_json),
-            "pdf_text": pdf_text[:30000], 
-            "question": user_question
-        })
-        return {"response": response.content}
+        session = await aget_chat_session(rfp, session_id, db)
+        inputs = await abuild_chat_inputs(rfp, user_question, db, session)
+        response = await cached_ainvoke(prompt, llm, inputs)
+        await arecord_turn(session, user_question, response.content, db)
+        return {
+            "response": response.content,
+            "session_id": session.id,
+            "prompt_tokens_est": estimate_tokens("".join(inputs.values()))
+        }
     except Exception as e:
-        return {"error": f"Chat failed: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Chat failed: {str(e)}"}
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_chat(rfp_id: int, user_question: str, session_id: str = None):
+    """
+    Streams the answer as SSE "token" events, then one "done" event with metadata.
+    Runs after the request's database session has closed, so it uses sessions of its
+    own; any failure, including loading the chat session or retrieval, becomes an
+    "error" event.
+    """
+    started = time.perf_counter()
+    first_token_ms = None
+    parts = []
+    try:
+        async with AsyncSessionLocal() as db:
+            rfp = await db.get(RFP, rfp_id)
+            if not rfp:
+                yield sse_event("error", {"error": "RFP not found"})
+                return
+            session = await aget_chat_session(rfp, session_id, db)
+            session_id = session.id
+            inputs = await abuild_chat_inputs(rfp, user_question, db, session)
+
+        async for chunk in (prompt | llm).astream(inputs):
+            if not chunk.content:
+                continue
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+            parts.append(chunk.content)
+            yield sse_event("token", {"text": chunk.content})
+
+        answer = "".join(parts)
+        async with AsyncSessionLocal() as db:
+            session = await db.get(ChatSession, session_id)
+            if session: await arecord_turn(session, user_question, answer, db)
+    except Exception as e:
+        yield sse_event("error", {"error": f"Chat failed: {str(e)}"})
+        return
+
+    yield sse_event("done", {
+        "rfp_id": rfp_id,
+        "session_id": session_id,
+        "response": answer,
+        "time_to_first_token_ms": round(first_token_ms, 1) if first_token_ms is not None else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "prompt_tokens_est": estimate_tokens("".join(inputs.values()))
+    })
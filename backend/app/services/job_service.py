@@ -0,0 +1,142 @@
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.database import SessionLocal, engine
+from app.models import Job
+from app.services.technical_agent import analyze_rfp_technical
+from app.services.pricing_agent import calculate_pricing
+from app.services.proposal_service import generate_proposal_ppt
+from app.services.pipeline_service import run_pipeline
+
+# Every handler takes (rfp_id, db) and returns a result dict, with an "error" key on failure
+JOB_HANDLERS = {
+    "technical": analyze_rfp_technical,
+    "pricing": calculate_pricing,
+    "proposal": generate_proposal_ppt,
+    "pipeline": run_pipeline,
+}
+
+_lock = threading.Lock()
+_executor = None
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _init_worker_process():
+    # Connections inherited from the parent process must not be reused after fork
+    engine.dispose(close=False)
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            workers = max(1, settings.JOB_WORKERS)
+            if settings.JOB_EXECUTOR == "process":
+                _executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker_process)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bidwin-job")
+        return _executor
+
+
+def _finish_job(job_id: int, db: Session, status: str, result=None, error: str = None):
+    db.execute(
+        update(Job)
+        .where(Job.id == job_id)
+        .values(status=status, result=result, error=error, finished_at=_now())
+    )
+    db.commit()
+
+
+def run_job(job_id: int):
+    """
+    Executes one queued job in a worker with its own DB session.
+    Top-level so it can be shipped to a process pool.
+    """
+    db = SessionLocal()
+    try:
+        # Atomic claim: only one worker moves a job out of Queued, even if it was submitted twice
+        claimed = db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "Queued")
+            .values(status="Running", started_at=_now())
+        )
+        db.commit()
+        if claimed.rowcount != 1:
+            return
+
+        try:
+            kind, rfp_id = db.execute(select(Job.kind, Job.rfp_id).where(Job.id == job_id)).one()
+            result = JOB_HANDLERS[kind](rfp_id, db)
+            if isinstance(result, dict) and result.get("error"):
+                _finish_job(job_id, db, "Failed", result, str(result["error"]))
+            else:
+                _finish_job(job_id, db, "Done", result)
+        except Exception as e:
+            # Anything that escapes (handler, lookup or saving the result) must not leave the job Running
+            db.rollback()
+            _finish_job(job_id, db, "Failed", {"error": f"{type(e).__name__}: {e}"}, f"{type(e).__name__}: {e}")
+    finally:
+        db.close()
+
+
+def submit_job(job_id: int):
+    _get_executor().submit(run_job, job_id)
+
+
+def enqueue_job(kind: str, rfp_id: int, db: Session) -> Job:
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = Job(kind=kind, rfp_id=rfp_id, status="Queued")
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    submit_job(job.id)
+    return job
+
+
+def job_to_dict(job: Job, include_result: bool = True) -> dict:
+    data = {
+        "job_id": job.id,
+        "kind": job.kind,
+        "rfp_id": job.rfp_id,
+        "status": job.status,
+        "error": job.error,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+    }
+    if include_result:
+        data["result"] = job.result
+    return data
+
+
+def recover_jobs(db: Session):
+    """
+    Called on startup: jobs that were running when the server stopped are marked failed,
+    and jobs still queued are handed to the new worker pool.
+    """
+    interrupted = db.query(Job).filter(Job.status == "Running").all()
+    for job in interrupted:
+        job.status = "Failed"
+        job.error = "Interrupted by server restart"
+        job.finished_at = _now()
+    db.commit()
+
+    for job in db.query(Job).filter(Job.status == "Queued").order_by(Job.id).all():
+        submit_job(job.id)
+
+
+def shutdown_jobs():
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,174 @@
+import os
+import asyncio
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from langchain_core.messages import AIMessage
+from app.core.config import settings
+
+CACHE_PATH = "/app/data/llm_cache.sqlite3"
+
+# Eviction runs once every this many writes
+EVICT_EVERY_WRITES = 50
+
+_lock = threading.Lock()
+_conn = None
+_conn_pid = None
+_writes = 0
+_stats = {"hits": 0, "misses": 0, "bypassed": 0, "saved_latency_ms": 0.0}
+
+
+def _get_conn() -> sqlite3.Connection:
+    """
+    The process's SQLite connection. A connection inherited through fork (process-pool
+    workers) must not be used, so a new one is opened whenever the pid changes.
+    """
+    global _conn, _conn_pid
+    if _conn is None or _conn_pid != os.getpid():
+        os.makedirs(os.path.dirname(CACHE_PATH), exist_ok=True)
+        _conn = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                content TEXT NOT NULL,
+                latency_ms REAL NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache (accessed_at)")
+        _conn.commit()
+        _conn_pid = os.getpid()
+    return _conn
+
+
+def is_cacheable(llm) -> bool:
+    if not settings.LLM_CACHE_ENABLED:
+        return False
+    return settings.LLM_CACHE_ALL_TEMPERATURES or getattr(llm, "temperature", None) == 0
+
+
+def cache_key(prompt, llm, inputs: dict) -> str:
+    """
+    Fingerprint of model, temperature and the fully rendered prompt
+    (which covers both the template and its inputs).
+    """
+    messages = [(m.type, m.content) for m in prompt.format_messages(**inputs)]
+    payload = {
+        "model": getattr(llm, "model", None) or getattr(llm, "model_name", None),
+        "temperature": getattr(llm, "temperature", None),
+        "messages": messages,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def lookup(key: str):
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        row = conn.execute(
+            "SELECT content, latency_ms, created_at FROM llm_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[2] > settings.LLM_CACHE_TTL_SECONDS:
+            _stats["misses"] += 1
+            return None
+        conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        _stats["hits"] += 1
+        _stats["saved_latency_ms"] += row[1]
+    return AIMessage(content=row[0])
+
+
+def store(key: str, content: str, latency_ms: float):
+    global _writes
+    now = time.time()
+    with _lock:
+        conn = _get_conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, content, latency_ms, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, content, latency_ms, now, now)
+        )
+        _writes += 1
+        if _writes % EVICT_EVERY_WRITES == 0:
+            _evict(conn, now)
+        conn.commit()
+
+
+def _evict(conn: sqlite3.Connection, now: float):
+    conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - settings.LLM_CACHE_TTL_SECONDS,))
+    # Least recently used entries go first once over the size limit
+    conn.execute("""
+        DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+        )
+    """, (settings.LLM_CACHE_MAX_ENTRIES,))
+
+
+def _is_valid(content: str, validate) -> bool:
+    if validate is None:
+        return True
+    try:
+        validate(content)
+        return True
+    except Exception:
+        return False
+
+
+def cached_invoke(prompt, llm, inputs: dict, validate=None):
+    """
+    (prompt | llm).invoke(inputs), served from the cache when possible.
+    validate(content) may raise to keep an unusable response (e.g. broken JSON) out of the cache.
+    """
+    if not is_cacheable(llm):
+        _stats["bypassed"] += 1
+        return (prompt | llm).invoke(inputs)
+
+    key = cache_key(prompt, llm, inputs)
+    cached = lookup(key)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    response = (prompt | llm).invoke(inputs)
+    if _is_valid(response.content, validate):
+        store(key, response.content, (time.perf_counter() - started) * 1000)
+    return response
+
+
+async def cached_ainvoke(prompt, llm, inputs: dict, validate=None, timeout: float = None):
+    """
+    Async counterpart of cached_invoke; the timeout applies to the LLM call only.
+    SQLite reads and writes run in a worker thread, off the event loop.
+    """
+    chain = prompt | llm
+    if not is_cacheable(llm):
+        _stats["bypassed"] += 1
+        return await asyncio.wait_for(chain.ainvoke(inputs), timeout=timeout)
+
+    key = cache_key(prompt, llm, inputs)
+    cached = await asyncio.to_thread(lookup, key)
+    if cached is not None:
+        return cached
+
+    started = time.perf_counter()
+    response = await asyncio.wait_for(chain.ainvoke(inputs), timeout=timeout)
+    if _is_valid(response.content, validate):
+        await asyncio.to_thread(store, key, response.content, (time.perf_counter() - started) * 1000)
+    return response
+
+
+def get_llm_cache_stats() -> dict:
+    with _lock:
+        conn = _get_conn()
+        entries = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "saved_latency_ms": round(_stats["saved_latency_ms"], 1),
+            "hit_ratio": round(_stats["hits"] / lookups, 3) if lookups else None,
+            "entries": entries,
+            "max_entries": settings.LLM_CACHE_MAX_ENTRIES,
+        }
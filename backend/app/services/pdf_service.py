@@ -1,19 +1,323 @@
 import os
+import time
+import hashlib
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pypdf import PdfReader
 
+CACHE_DIR = "/app/data/pdf_cache"
+os.makedirs(CACHE_DIR, exist_ok=True)
+
+# In-memory tier budget (total characters held across all cached documents)
+MEMORY_BUDGET_CHARS = 50_000_000
+
+# Documents with at least this many pages are split across worker processes
+PARALLEL_MIN_PAGES = 40
+PARALLEL_WORKERS = os.cpu_count() or 2
+
+_lock = threading.Lock()
+_memory_cache = OrderedDict()   # sha256 -> text (LRU order)
+_memory_chars = 0
+_fingerprints = {}              # path -> (mtime, size, sha256)
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+_executor = None
+
+
+def file_sha256(file_path: str) -> str:
+    """
+    Content hash of a file, memoized on (mtime, size) so unchanged files are not re-read.
+    """
+    st = os.stat(file_path)
+    with _lock:
+        known = _fingerprints.get(file_path)
+    if known and known[0] == st.st_mtime and known[1] == st.st_size:
+        return known[2]
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    sha = digest.hexdigest()
+
+    with _lock:
+        _fingerprints[file_path] = (st.st_mtime, st.st_size, sha)
+    return sha
+
+
+def remember_file_sha256(file_path: str, sha: str):
+    """Seeds the hash memo for a file whose hash is already known (e.g. computed while it was written)."""
+    st = os.stat(file_path)
+    with _lock:
+        _fingerprints[file_path] = (st.st_mtime, st.st_size, sha)
+
+
+def _memory_get(sha: str):
+    with _lock:
+        text = _memory_cache.get(sha)
+        if text is not None:
+            _memory_cache.move_to_end(sha)
+        return text
+
+
+def _memory_put(sha: str, text: str):
+    global _memory_chars
+    if len(text) > MEMORY_BUDGET_CHARS:
+        return
+    with _lock:
+        old = _memory_cache.pop(sha, None)
+        if old is not None:
+            _memory_chars -= len(old)
+        _memory_cache[sha] = text
+        _memory_chars += len(text)
+        while _memory_chars > MEMORY_BUDGET_CHARS:
+            _, evicted = _memory_cache.popitem(last=False)
+            _memory_chars -= len(evicted)
+            _stats["evictions"] += 1
+
+
+def _disk_path(sha: str) -> str:
+    return os.path.join(CACHE_DIR, f"{sha}.txt")
+
+
+def _disk_get(sha: str):
+    path = _disk_path(sha)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _disk_put(sha: str, text: str):
+    # Write to a temp file first so concurrent readers never see a partial file
+    path = _disk_path(sha)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not persist PDF text cache: {e}")
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # forkserver, not fork: workers must not inherit locks held by other server threads
+            _executor = ProcessPoolExecutor(max_workers=PARALLEL_WORKERS, mp_context=multiprocessing.get_context("forkserver"))
+        return _executor
+
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drops a broken pool (e.g. a worker was OOM-killed) so the next call starts a fresh one."""
+    global _executor
+    with _lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pdf_pool():
+    with _lock:
+        executor = _executor
+    if executor is not None:
+        _discard_executor(executor)
+
+
+def _extract_page_range(file_path: str, start: int, end: int) -> list:
+    # Runs inside a worker process, so it opens its own reader
+    reader = PdfReader(file_path)
+    return [reader.pages[i].extract_text() for i in range(start, end)]
+
+
+def extract_pages_from_pdf(file_path: str, parallel: bool = None) -> list:
+    """
+    Returns the text of every page as a list.
+    Large documents are split into page ranges and extracted on a process pool;
+    if the pool breaks, it is replaced and the document is extracted serially.
+    """
+    reader = PdfReader(file_path)
+    page_count = len(reader.pages)
+
+    if parallel is None:
+        parallel = page_count >= PARALLEL_MIN_PAGES and PARALLEL_WORKERS > 1
+    if not parallel or page_count < 2:
+        return [page.extract_text() for page in reader.pages]
+
+    chunk = -(-page_count // PARALLEL_WORKERS)
+    ranges = [(start, min(start + chunk, page_count)) for start in range(0, page_count, chunk)]
+    executor = _get_executor()
+    try:
+        futures = [executor.submit(_extract_page_range, file_path, start, end) for start, end in ranges]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+        return pages
+    except BrokenProcessPool as e:
+        print(f"PDF worker pool broke ({e}); extracting serially")
+        _discard_executor(executor)
+        return [page.extract_text() for page in reader.pages]
+
+
+def _parse_pdf(file_path: str) -> str:
+    return "".join(f"{page}\n" for page in extract_pages_from_pdf(file_path))
+
+
 def extract_text_from_pdf(file_path: str) -> str:
     """
     Reads a local PDF file and returns the text.
+    Results are cached by content hash (memory LRU first, then disk).
     """
     if not os.path.exists(file_path):
         return ""
 
     try:
-        reader = PdfReader(file_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
+        sha = file_sha256(file_path)
+
+        text = _memory_get(sha)
+        if text is not None:
+            _stats["memory_hits"] += 1
+            return text
+
+        text = _disk_get(sha)
+        if text is not None:
+            _stats["disk_hits"] += 1
+            _memory_put(sha, text)
+            return text
+
+        _stats["misses"] += 1
+        text = _parse_pdf(file_path)
+        _memory_put(sha, text)
+        _disk_put(sha, text)
         return text
     except Exception as e:
         print(f"Error reading PDF: {e}")
-        return ""
\ No newline at end of file
+        return ""
+
+
+def iter_pdf_pages(file_path: str):
+    """
+    Yields page text one page at a time, parsing each page only when requested.
+    """
+    reader = PdfReader(file_path)
+    for page in reader.pages:
+        yield page.extract_text()
+
+
+def extract_text_prefix(file_path: str, max_chars: int) -> str:
+    """
+    Returns the first max_chars characters of the document text, i.e. the same as
+    extract_text_from_pdf(file_path)[:max_chars], but stops parsing once the budget is met.
+    """
+    if not os.path.exists(file_path):
+        return ""
+
+    try:
+        sha = file_sha256(file_path)
+
+        text = _memory_get(sha)
+        if text is None:
+            text = _disk_get(sha)
+            if text is not None:
+                _stats["disk_hits"] += 1
+                _memory_put(sha, text)
+        else:
+            _stats["memory_hits"] += 1
+        if text is not None:
+            return text[:max_chars]
+
+        # Partial parses are kept in memory only; the disk tier holds complete documents
+        prefix_key = f"{sha}:prefix"
+        prefix = _memory_get(prefix_key)
+        if prefix is not None and len(prefix) >= max_chars:
+            _stats["memory_hits"] += 1
+            return prefix[:max_chars]
+
+        _stats["misses"] += 1
+        parts = []
+        total = 0
+        complete = True
+        for page in iter_pdf_pages(file_path):
+            parts.append(f"{page}\n")
+            total += len(parts[-1])
+            if total >= max_chars:
+                complete = False
+                break
+
+        text = "".join(parts)
+        if complete:
+            _memory_put(sha, text)
+            _disk_put(sha, text)
+        else:
+            _memory_put(prefix_key, text)
+        return text[:max_chars]
+    except Exception as e:
+        print(f"Error reading PDF: {e}")
+        return ""
+
+
+def benchmark_pdf_extraction(file_path: str, runs: int = 3) -> dict:
+    """
+    Serial vs process-pool page extraction of one document, bypassing the text cache.
+    Pool start-up is measured separately; each mode reports its best of `runs`.
+    """
+    started = time.perf_counter()
+    _get_executor().submit(int).result()
+    pool_start_ms = (time.perf_counter() - started) * 1000
+
+    def best(parallel: bool) -> tuple:
+        times, pages = [], None
+        for _ in range(runs):
+            started = time.perf_counter()
+            pages = extract_pages_from_pdf(file_path, parallel=parallel)
+            times.append(time.perf_counter() - started)
+        return min(times), pages
+
+    serial, serial_pages = best(False)
+    parallel, parallel_pages = best(True)
+    return {
+        "pages": len(serial_pages),
+        "workers": PARALLEL_WORKERS,
+        "pool_start_ms": round(pool_start_ms, 1),
+        "serial_ms": round(serial * 1000, 1),
+        "parallel_ms": round(parallel * 1000, 1),
+        "speedup": round(serial / parallel, 2),
+        "identical_text": serial_pages == parallel_pages,
+        "parallel_by_default": len(serial_pages) >= PARALLEL_MIN_PAGES and PARALLEL_WORKERS > 1,
+    }
+
+
+def get_pdf_cache_stats() -> dict:
+    with _lock:
+        return {
+            **_stats,
+            "memory_entries": len(_memory_cache),
+            "memory_chars": _memory_chars,
+            "memory_budget_chars": MEMORY_BUDGET_CHARS,
+        }
+
+
+def clear_pdf_cache(disk: bool = False):
+    global _memory_chars
+    with _lock:
+        _memory_cache.clear()
+        _memory_chars = 0
+        _fingerprints.clear()
+    if disk:
+        for name in os.listdir(CACHE_DIR):
+            if name.endswith(".txt"):
+                os.remove(os.path.join(CACHE_DIR, name))
+
+
+if __name__ == "__main__":
+    # python -m app.services.pdf_service <pdf path> [runs]
+    import sys
+    import json
+
+    print(json.dumps(benchmark_pdf_extraction(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 3), indent=2))
@@ -0,0 +1,70 @@
+import time
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import flag_modified
+from app.models import RFP
+from app.services.technical_agent import run_technical_stage
+from app.services.pricing_agent import price_documents
+from app.services.catalog_cache import get_catalog_snapshot
+from app.services.proposal_service import render_proposal
+
+
+def _save(rfp, data: dict, status: str, db: Session):
+    rfp.extracted_data = data
+    flag_modified(rfp, "extracted_data")
+    rfp.status = status
+    db.commit()
+
+
+def run_pipeline(rfp_id: int, db: Session, checkpoint: bool = False):
+    """
+    Technical -> Pricing -> Proposal in one process.
+    The RFP row is loaded once and stage results are passed along in memory.
+    By default the DB is written once at the end; with checkpoint=True each
+    stage's result is committed as it completes (same statuses as the individual routes).
+    """
+    timings = {}
+    started = time.perf_counter()
+
+    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
+    if not rfp: return {"error": "RFP not found"}
+
+    t = time.perf_counter()
+    technical = run_technical_stage(rfp, db)
+    timings["technical_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    if "error" in technical:
+        return {"error": technical["error"], "failed_stage": "technical", "timings": timings}
+
+    data = technical["extracted_data"]
+    if checkpoint:
+        _save(rfp, data, "Processed", db)
+
+    t = time.perf_counter()
+    data["commercial"] = price_documents([data], get_catalog_snapshot(db))[0]
+    timings["pricing_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    if checkpoint:
+        _save(rfp, data, "Pricing Complete", db)
+
+    t = time.perf_counter()
+    try:
+        proposal = render_proposal(rfp.id, rfp.client_name, rfp.title, data)
+    except Exception as e:
+        # Keep the analysis and quote even if the deck could not be rendered
+        _save(rfp, data, "Pricing Complete", db)
+        return {"error": f"Proposal generation failed: {str(e)}", "failed_stage": "proposal", "timings": timings}
+    timings["proposal_ms"] = round((time.perf_counter() - t) * 1000, 1)
+
+    t = time.perf_counter()
+    _save(rfp, data, "Ready to Submit", db)
+    timings["persist_ms"] = round((time.perf_counter() - t) * 1000, 1)
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    return {
+        "status": "success",
+        "rfp_id": rfp.id,
+        "item_count": len(data["line_items"]),
+        "grand_total": data["commercial"]["grand_total_inr"],
+        "match_stats": technical["match_stats"],
+        "file_url": proposal["file_url"],
+        "download_url": proposal["download_url"],
+        "timings": timings
+    }
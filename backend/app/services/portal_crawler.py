@@ -0,0 +1,395 @@
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+from dataclasses import dataclass
+from urllib.parse import urlparse, urljoin
+import httpx
+from bs4 import SoupStrainer
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models import PortalState
+from app.services.sales_service import make_soup, parse_portal, ingest_tenders, UploadTooLarge
+
+_scheduler_task = None
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: str  # ok, not_modified
+    body: bytes = b""
+    etag: str = None
+    last_modified: str = None
+
+
+@dataclass(frozen=True)
+class PageState:
+    """Detached copy of a PortalState row, safe to read from the crawl's event loop."""
+    content_sha256: str
+    etag: str
+    last_modified: str
+    next_url: str
+    tender_count: int = 0
+
+
+class PortalSource:
+    """
+    Adapter for one tender portal. Subclasses turn a fetched page into tender
+    dicts (see sales_service.parse_portal) and find the next page, if any.
+    """
+
+    def __init__(self, name: str, url: str, max_pages: int = None):
+        self.name = name
+        self.url = url
+        self.max_pages = max_pages or settings.PORTAL_MAX_PAGES
+
+    def parse_page(self, html: bytes, page_url: str) -> list:
+        raise NotImplementedError
+
+    def next_page_url(self, html: bytes, page_url: str):
+        return None
+
+    def page_key(self, page_url: str) -> str:
+        return f"{self.name}|{page_url}"
+
+
+class TenderListSource(PortalSource):
+    """Portals using the li.tender-item markup, paginated with <a rel="next">."""
+
+    NEXT_LINK = SoupStrainer("a", attrs={"rel": "next"})
+
+    def parse_page(self, html: bytes, page_url: str) -> list:
+        return parse_portal(html, source=self.name, base=page_base(page_url))
+
+    def next_page_url(self, html: bytes, page_url: str):
+        link = make_soup(html, only=self.NEXT_LINK).find("a", href=True)
+        if link is None:
+            return None
+        return resolve_page(page_url, link["href"])
+
+
+# adapter name in PORTAL_SOURCES -> PortalSource subclass
+ADAPTERS = {
+    "tender_list": TenderListSource,
+}
+
+
+def is_remote(url: str) -> bool:
+    return urlparse(url).scheme in ("http", "https")
+
+
+def page_base(page_url: str) -> str:
+    return page_url if is_remote(page_url) else os.path.dirname(page_url)
+
+
+def resolve_page(page_url: str, href: str) -> str:
+    if is_remote(page_url):
+        return urljoin(page_url, href)
+    return os.path.normpath(os.path.join(os.path.dirname(page_url), href))
+
+
+def load_sources() -> list:
+    return [
+        ADAPTERS[config.get("adapter", "tender_list")](config["name"], config["url"], config.get("max_pages"))
+        for config in settings.PORTAL_SOURCES
+    ]
+
+
+class Fetcher:
+    """
+    One pooled HTTP client shared by every source (connections are reused per host),
+    with at most PORTAL_PER_HOST_CONCURRENCY requests in flight to any one host.
+    Local paths are read in a worker thread and fingerprinted by mtime/size.
+    """
+
+    def __init__(self):
+        self.client = httpx.AsyncClient(
+            timeout=settings.PORTAL_FETCH_TIMEOUT_SECONDS,
+            follow_redirects=True,
+            headers={"User-Agent": "BidWin-SalesAgent/1.0"},
+        )
+        self.host_limits = {}
+
+    def _semaphore(self, host: str) -> asyncio.Semaphore:
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(max(1, settings.PORTAL_PER_HOST_CONCURRENCY))
+        return self.host_limits[host]
+
+    async def fetch(self, url: str, state: PageState = None, force: bool = False) -> FetchResult:
+        if not is_remote(url):
+            return await self._fetch_file(url, state, force)
+
+        headers = {}
+        if state and not force:
+            if state.etag:
+                headers["If-None-Match"] = state.etag
+            if state.last_modified:
+                headers["If-Modified-Since"] = state.last_modified
+        async with self._semaphore(urlparse(url).netloc):
+            response = await self.client.get(url, headers=headers)
+        if response.status_code == 304:
+            return FetchResult(url, "not_modified")
+        response.raise_for_status()
+        return FetchResult(
+            url, "ok", response.content,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+
+    async def _fetch_file(self, path: str, state: PageState, force: bool) -> FetchResult:
+        st = await asyncio.to_thread(os.stat, path)
+        last_modified = f"{st.st_mtime_ns}:{st.st_size}"
+        if state and not force and state.last_modified == last_modified:
+            return FetchResult(path, "not_modified")
+        body = await asyncio.to_thread(_read_file, path)
+        return FetchResult(path, "ok", body, last_modified=last_modified)
+
+    async def download(self, url: str, dest_path: str, max_bytes: int):
+        """
+        Streams a remote document to a temp file next to dest_path, chunk by chunk, and
+        renames it into place once complete, so a reader never sees a partial PDF.
+        Gives up once the document exceeds max_bytes.
+        """
+        tmp = await asyncio.to_thread(_open_temp, dest_path)
+        try:
+            size = 0
+            async with self._semaphore(urlparse(url).netloc):
+                async with self.client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > max_bytes:
+                            raise UploadTooLarge(f"{url} exceeds {max_bytes // (1024 * 1024)} MB")
+                        await asyncio.to_thread(tmp.write, chunk)
+            await asyncio.to_thread(tmp.close)
+            await asyncio.to_thread(os.replace, tmp.name, dest_path)
+        except BaseException:
+            await asyncio.to_thread(_discard_temp, tmp)
+            raise
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _open_temp(dest_path: str):
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=os.path.dirname(dest_path), suffix=".part", delete=False)
+
+
+def _discard_temp(tmp):
+    tmp.close()
+    if os.path.exists(tmp.name):
+        os.remove(tmp.name)
+
+
+async def download_documents(items: list, fetcher: Fetcher, force: bool = False) -> tuple:
+    """
+    Downloads the PDFs of remote tenders (source_url) to their local file_url.
+    Documents already on disk are kept unless force. Returns (downloaded, failed urls).
+    """
+    pending = {item["source_url"]: item["file_url"] for item in items if item.get("source_url")}
+    if not force:
+        on_disk = await asyncio.to_thread(lambda: {url for url, path in pending.items() if os.path.exists(path)})
+        pending = {url: path for url, path in pending.items() if url not in on_disk}
+
+    max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+    results = await asyncio.gather(
+        *[fetcher.download(url, path, max_bytes) for url, path in pending.items()],
+        return_exceptions=True
+    )
+    failed = []
+    for url, result in zip(pending, results):
+        if isinstance(result, Exception):
+            print(f"Document download failed for {url}: {result}")
+            failed.append(url)
+    return len(pending) - len(failed), failed
+
+
+def load_page_states() -> dict:
+    db = SessionLocal()
+    try:
+        return {
+            row.source: PageState(
+                row.content_sha256, row.etag, row.last_modified, row.next_url, row.tender_count or 0
+            )
+            for row in db.query(PortalState).all()
+        }
+    finally:
+        db.close()
+
+
+async def crawl_source(source: PortalSource, fetcher: Fetcher, states: dict, force: bool = False) -> dict:
+    """
+    Walks the source's pages. Pages that are not modified (conditional fetch) or whose
+    content hash is unchanged are skipped without parsing; their stored next link is
+    still followed, and the tenders they held at their last parse are counted in
+    tenders_skipped. Remote tender PDFs on parsed pages are downloaded to the uploads dir.
+
+    A page whose downloads fail keeps its previous fingerprint and its tenders with
+    missing PDFs are left out, so the next scan parses it again and retries them.
+    """
+    timings = {"fetch_ms": 0.0, "parse_ms": 0.0, "download_ms": 0.0}
+    items, pages, skipped, skipped_tenders = [], [], 0, 0
+    downloaded, failed = 0, []
+    url, seen = source.url, set()
+    while url and url not in seen and len(seen) < source.max_pages:
+        seen.add(url)
+        key = source.page_key(url)
+        state = states.get(key)
+        started = time.perf_counter()
+        result = await fetcher.fetch(url, state, force)
+        timings["fetch_ms"] += (time.perf_counter() - started) * 1000
+        if result.status == "not_modified":
+            skipped += 1
+            skipped_tenders += state.tender_count
+            url = state.next_url
+            continue
+
+        content_sha256 = hashlib.sha256(result.body).hexdigest()
+        started = time.perf_counter()
+        next_url = await asyncio.to_thread(source.next_page_url, result.body, url)
+        timings["parse_ms"] += (time.perf_counter() - started) * 1000
+        page = {
+            "source": key,
+            "content_sha256": content_sha256,
+            "etag": result.etag,
+            "last_modified": result.last_modified,
+            "next_url": next_url,
+        }
+        if state and not force and state.content_sha256 == content_sha256:
+            skipped += 1
+            skipped_tenders += state.tender_count
+            pages.append(page)
+        else:
+            started = time.perf_counter()
+            page_items = await asyncio.to_thread(source.parse_page, result.body, url)
+            timings["parse_ms"] += (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            page_downloaded, page_failed = await download_documents(page_items, fetcher, force)
+            timings["download_ms"] += (time.perf_counter() - started) * 1000
+            downloaded += page_downloaded
+            failed.extend(page_failed)
+
+            if page_failed:
+                missing = set(page_failed)
+                items.extend(item for item in page_items if item.get("source_url") not in missing)
+            else:
+                page["tender_count"] = len(page_items)
+                items.extend(page_items)
+                pages.append(page)
+        url = next_url
+
+    return {
+        "source": source.name,
+        "items": items,
+        "pages": pages,
+        "pages_fetched": len(seen),
+        "pages_skipped": skipped,
+        "tenders_skipped": skipped_tenders,
+        "documents_downloaded": downloaded,
+        "documents_failed": failed,
+        "timings_ms": timings,
+    }
+
+
+def save_source(crawl: dict) -> dict:
+    """One transaction per source: its tenders and its page fingerprints."""
+    db = SessionLocal()
+    try:
+        written = ingest_tenders(crawl["items"], db)
+        for page in crawl["pages"]:
+            state = db.get(PortalState, page["source"])
+            if state is None:
+                state = PortalState(source=page["source"])
+                db.add(state)
+            for column, value in page.items():
+                setattr(state, column, value)
+        db.commit()
+        return written
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def scan_source(source: PortalSource, fetcher: Fetcher, states: dict, force: bool) -> dict:
+    try:
+        crawl = await crawl_source(source, fetcher, states, force)
+        written = await asyncio.to_thread(save_source, crawl)
+    except Exception as e:
+        return {"source": source.name, "error": f"Scan failed: {str(e)}"}
+    return {
+        "source": source.name,
+        # Tenders on unchanged pages are still on the portal; they just weren't re-parsed
+        "scanned_count": len(crawl["items"]) + crawl["tenders_skipped"],
+        "pages_fetched": crawl["pages_fetched"],
+        "pages_skipped": crawl["pages_skipped"],
+        "tenders_skipped": crawl["tenders_skipped"],
+        "documents_downloaded": crawl["documents_downloaded"],
+        "documents_failed": crawl["documents_failed"],
+        "new_rfps": written["new_rfps"],
+        "updated_rfps": written["updated_rfps"],
+        "timings_ms": {k: round(v, 2) for k, v in {**crawl["timings_ms"], **written["timings_ms"]}.items()},
+    }
+
+
+async def scan_portals(force: bool = False, sources: list = None) -> dict:
+    """
+    Crawls every configured source concurrently, so wall time tracks the
+    slowest source rather than the sum of all of them.
+    """
+    started = time.perf_counter()
+    sources = sources if sources is not None else load_sources()
+    states = await asyncio.to_thread(load_page_states)
+    fetcher = Fetcher()
+    try:
+        results = await asyncio.gather(*[scan_source(s, fetcher, states, force) for s in sources])
+    finally:
+        await fetcher.aclose()
+
+    ok = [r for r in results if "error" not in r]
+    return {
+        "status": "success" if len(ok) == len(results) else "partial",
+        "scanned_count": sum(r["scanned_count"] for r in ok),
+        "new_rfps": [rfp for r in ok for rfp in r["new_rfps"]],
+        "updated_rfps": [rfp for r in ok for rfp in r["updated_rfps"]],
+        "sources": results,
+        "wall_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+async def _scheduler_loop(interval: int):
+    while True:
+        try:
+            result = await scan_portals()
+            print(f"Scheduled portal scan: {len(result['new_rfps'])} new, {len(result['updated_rfps'])} updated")
+        except Exception as e:
+            print(f"Scheduled portal scan failed: {e}")
+        await asyncio.sleep(interval)
+
+
+def start_scheduler():
+    """Starts periodic scans on the running event loop when PORTAL_SCAN_INTERVAL_SECONDS > 0."""
+    global _scheduler_task
+    if settings.PORTAL_SCAN_INTERVAL_SECONDS > 0 and _scheduler_task is None:
+        _scheduler_task = asyncio.create_task(_scheduler_loop(settings.PORTAL_SCAN_INTERVAL_SECONDS))
+
+
+async def stop_scheduler():
+    global _scheduler_task
+    if _scheduler_task is not None:
+        _scheduler_task.cancel()
+        try:
+            await _scheduler_task
+        except asyncio.CancelledError:
+            pass
+        _scheduler_task = None
@@ -1,7 +1,12 @@
 import re
+from functools import lru_cache
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
-from app.models import RFP, Product
+from app.models import RFP
+from app.services.catalog_cache import get_catalog_snapshot
+from app.services.rate_card import RateCardMatcher
+from app.core.config import settings
 
 # DUMMY SERVICE RATE CARD (As per Problem Statement)
 SERVICE_RATE_CARD = {
@@ -15,76 +20,97 @@ SERVICE_RATE_CARD = {
     "FAT": 10000.0
 }
 
-def calculate_pricing(rfp_id: int, db: Session):
-    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
-    if not rfp or not rfp.extracted_data:
-        return {"error": "Data not found"}
+# Alternative spellings seen in tenders, mapped to rate-card keys
+SERVICE_SYNONYMS = {
+    "Third Party Inspection": ["Third-Party Inspection", "TPI"],
+    "Factory Acceptance Test": ["Factory Acceptance Testing"],
+    "High Voltage Test": ["High-Voltage Test", "HV Test"],
+    "Salt Spray Test": ["Salt Fog Test", "Salt-Spray Test"],
+    "Routine Test": ["Routine Testing"],
+    "Type Test": ["Type Testing"],
+}
+
+# Flat fee for tests that match nothing on the rate card
+DEFAULT_SERVICE_COST = 5000.0
+
+DEFAULT_RATES = {
+    "logistics": 0.05,
+    "margin": 0.20,
+    "gst": 0.18
+}
+
+QTY_PATTERN = re.compile(r"[-+]?\d*\.\d+|\d+")
+
+
+def parse_quantity(raw) -> float:
+    try:
+        nums = QTY_PATTERN.findall(str(raw))
+        return float(nums[0]) if nums else 1.0
+    except:
+        return 1.0
+
+
+def price_line_arrays(qty: np.ndarray, unit_price: np.ndarray, rates: dict = None) -> dict:
+    """
+    Prices every line in one vectorized pass.
+    Operations are applied in the same order as the original per-line formula,
+    so float results are bit-for-bit identical.
+    """
+    rates = {**DEFAULT_RATES, **(rates or {})}
+    line_base = unit_price * qty
+    logistics = line_base * rates["logistics"]
+    margin = line_base * rates["margin"]
+    gst = (line_base + logistics + margin) * rates["gst"]
+    line_total = line_base + logistics + margin + gst
+    return {
+        "base": line_base,
+        "logistics": logistics,
+        "margin": margin,
+        "gst": gst,
+        "total": line_total
+    }
 
-    data = dict(rfp.extracted_data)
-    
-    if "line_items" not in data:
-        return {"error": "Old data format. Please re-run Technical Analysis."}
 
-    line_items = data["line_items"]
-    commercial_lines = []
-    
-    for line in line_items:
+def collect_priceable_lines(data: dict, catalog) -> list:
+    """(item_name, sku, qty, unit_price) for every matched line whose product still exists."""
+    lines = []
+    for line in data.get("line_items", []):
         match = line.get("match")
         if not match: continue
 
-        product = db.query(Product).filter(Product.id == match["product_id"]).first()
+        product = catalog.by_id.get(match["product_id"])
         if not product: continue
-        
-        base_price = product.base_price
-        
-        qty_str = str(line["requirement"].get("quantity", "1"))
-        try:
-            nums = re.findall(r"[-+]?\d*\.\d+|\d+", qty_str)
-            qty = float(nums[0]) if nums else 1.0
-        except:
-            qty = 1.0
-
-        line_base = base_price * qty
-        logistics = line_base * 0.05
-        margin = line_base * 0.20
-        gst = (line_base + logistics + margin) * 0.18
-        line_total = line_base + logistics + margin + gst
-        
-        commercial_lines.append({
-            "item_name": line["requirement"]["item_name"],
-            "sku": product.sku,
-            "qty": qty,
-            "unit_price": base_price,
-            "line_total": round(line_total, 2),
-            "breakdown": {
-                "base": round(line_base, 2),
-                "logistics": round(logistics, 2),
-                "margin": round(margin, 2),
-                "gst": round(gst, 2)
-            }
-        })
 
+        qty = parse_quantity(line["requirement"].get("quantity", "1"))
+        lines.append((line["requirement"]["item_name"], product.sku, qty, product.base_price))
+    return lines
+
+
+_rate_card_matcher = RateCardMatcher(SERVICE_RATE_CARD, SERVICE_SYNONYMS)
+
+
+@lru_cache(maxsize=4096)
+def match_service(normalized_test_name: str, mode: str):
+    return _rate_card_matcher.match(normalized_test_name, mode)
+
+
+def price_services(data: dict) -> tuple:
     extracted_tests = data.get("required_tests", [])
-    
+
     if isinstance(extracted_tests, str):
         extracted_tests = [extracted_tests]
-        
+
     service_lines = []
     total_service_cost = 0.0
-    
+
     for test_name in extracted_tests:
-        cost = 0.0
-        matched_service = "Miscellaneous Testing"
-        
-        for key, rate in SERVICE_RATE_CARD.items():
-            if key.lower() in str(test_name).lower():
-                cost = rate
-                matched_service = key
-                break
-        
-        if cost == 0.0: 
-            cost = 5000.0 
-        
+        key = match_service(str(test_name).lower(), settings.RATE_CARD_MATCH_MODE)
+        matched_service = key or "Miscellaneous Testing"
+        cost = SERVICE_RATE_CARD[key] if key else 0.0
+
+        if cost == 0.0:
+            cost = DEFAULT_SERVICE_COST
+
         total_service_cost += cost
         service_lines.append({
             "test_name": str(test_name),
@@ -92,27 +118,119 @@ def calculate_pricing(rfp_id: int, db: Session):
             "cost": cost
         })
 
-    grand_total_products = sum(line['line_total'] for line in commercial_lines)
-    grand_total_project = grand_total_products + total_service_cost
+    return service_lines, total_service_cost
+
+
+def price_documents(documents: list, catalog, rates: dict = None) -> list:
+    """
+    Prices many RFPs' extracted_data dicts at once: all product lines across all
+    documents go through a single columnar pass, then are split back per document.
+    Returns one commercial dict per document.
+    """
+    per_doc_lines = [collect_priceable_lines(data, catalog) for data in documents]
+    flat = [line for lines in per_doc_lines for line in lines]
+
+    qty = np.array([line[2] for line in flat], dtype=np.float64)
+    unit_price = np.array([line[3] for line in flat], dtype=np.float64)
+    priced = price_line_arrays(qty, unit_price, rates)
+    # Python's round() on float64 values, to match the previous rounding exactly
+    rounded = {key: [round(v, 2) for v in arr.tolist()] for key, arr in priced.items()}
+
+    results = []
+    offset = 0
+    for data, lines in zip(documents, per_doc_lines):
+        commercial_lines = []
+        for i, (item_name, sku, line_qty, base_price) in enumerate(lines, start=offset):
+            commercial_lines.append({
+                "item_name": item_name,
+                "sku": sku,
+                "qty": line_qty,
+                "unit_price": base_price,
+                "line_total": rounded["total"][i],
+                "breakdown": {
+                    "base": rounded["base"][i],
+                    "logistics": rounded["logistics"][i],
+                    "margin": rounded["margin"][i],
+                    "gst": rounded["gst"][i]
+                }
+            })
+        offset += len(lines)
+
+        service_lines, total_service_cost = price_services(data)
+
+        grand_total_products = sum(line['line_total'] for line in commercial_lines)
+        grand_total_project = grand_total_products + total_service_cost
+
+        results.append({
+            "lines": commercial_lines,
+            "services": service_lines,
+            "product_total": round(grand_total_products, 2),
+            "service_total": round(total_service_cost, 2),
+            "grand_total_inr": round(grand_total_project, 2),
+            "currency": "INR"
+        })
+    return results
+
+
+def calculate_pricing(rfp_id: int, db: Session):
+    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
+    if not rfp or not rfp.extracted_data:
+        return {"error": "Data not found"}
+
+    data = dict(rfp.extracted_data)
+
+    if "line_items" not in data:
+        return {"error": "Old data format. Please re-run Technical Analysis."}
+
+    commercial = price_documents([data], get_catalog_snapshot(db))[0]
+    data["commercial"] = commercial
 
-    data["commercial"] = {
-        "lines": commercial_lines,           
-        "services": service_lines,          
-        "product_total": round(grand_total_products, 2),
-        "service_total": round(total_service_cost, 2),
-        "grand_total_inr": round(grand_total_project, 2),
-        "currency": "INR"
-    }
-    
     rfp.extracted_data = data
-    flag_modified(rfp, "extracted_data") 
-    
+    flag_modified(rfp, "extracted_data")
+
     rfp.status = "Pricing Complete"
     db.commit()
 
     return {
         "status": "success",
-        "grand_total": round(grand_total_project, 2),
-        "line_items": len(commercial_lines),
-        "tests_added": len(service_lines)
-    }
\ No newline at end of file
+        "grand_total": commercial["grand_total_inr"],
+        "line_items": len(commercial["lines"]),
+        "tests_added": len(commercial["services"])
+    }
+
+
+def calculate_pricing_bulk(rfp_ids: list, db: Session, rates: dict = None, persist: bool = True):
+    """
+    Prices many RFPs in one call. With persist=False nothing is written, which
+    allows what-if re-pricing with different rates.
+    """
+    rfps = db.query(RFP).filter(RFP.id.in_(rfp_ids)).all()
+    priceable = [r for r in rfps if r.extracted_data and "line_items" in r.extracted_data]
+    skipped = sorted(set(rfp_ids) - {r.id for r in priceable})
+
+    commercials = price_documents([dict(r.extracted_data) for r in priceable], get_catalog_snapshot(db), rates)
+
+    results = []
+    for rfp, commercial in zip(priceable, commercials):
+        if persist:
+            data = dict(rfp.extracted_data)
+            data["commercial"] = commercial
+            rfp.extracted_data = data
+            flag_modified(rfp, "extracted_data")
+            rfp.status = "Pricing Complete"
+        results.append({
+            "rfp_id": rfp.id,
+            "grand_total": commercial["grand_total_inr"],
+            "line_items": len(commercial["lines"]),
+            "tests_added": len(commercial["services"])
+        })
+
+    if persist:
+        db.commit()
+
+    return {
+        "status": "success",
+        "priced": results,
+        "skipped": skipped,
+        "rates": {**DEFAULT_RATES, **(rates or {})}
+    }
@@ -1,11 +1,21 @@
+import io
 import os
+import re
+import time
+import tempfile
+import multiprocessing
+import threading
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pptx import Presentation
 from pptx.util import Inches, Pt
 from pptx.dml.color import RGBColor
 from pptx.enum.text import PP_ALIGN, MSO_ANCHOR
 from pptx.enum.shapes import MSO_SHAPE
+from sqlalchemy import update
 from sqlalchemy.orm import Session
+from app.core.config import settings
 from app.models import RFP
 
 OUTPUT_DIR = "/app/data/generated_proposals"
@@ -83,18 +93,75 @@ def format_table_header(table):
             for run in paragraph.runs:
                 set_font(run, size=10, bold=True, color=COLOR_WHITE)
 
-def generate_proposal_ppt(rfp_id: int, db: Session):
-    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
-    if not rfp: return {"error": "RFP not found"}
-    
-    data = rfp.extracted_data
-    if not data: return {"error": "Data empty"}
+# Table rows reserved in the master deck; unused rows are dropped per proposal
+BOQ_ROWS = 8
+QUOTE_ROWS = 8
 
+# Shapes that only exist when the RFP has at least one line item
+FOCUS_SHAPES = ("focus_table", "focus_reason", "focus_scores")
+
+TOKEN = re.compile(r"\{\{(\w+)\}\}")
+
+_master_lock = threading.Lock()
+_master_bytes = None
+_executor = None
+
+def proposal_fields(client_name: str, title: str, data: dict) -> tuple:
+    """
+    Display strings for one proposal, plus the variable layout:
+    returns (fields, {"boq_table": rows, "quote_table": rows}, has_focus).
+    """
     # Safe Data Extraction
     line_items = data.get("line_items", [])
     commercial = data.get("commercial", {})
     services = commercial.get("services", [])
-    
+
+    fields = {
+        "client_upper": client_name.upper(),
+        "client_name": client_name,
+        "title": title,
+        "date": datetime.now().strftime('%d %B %Y'),
+        "total_card": f"₹ {commercial.get('grand_total_inr', '0')}",
+        "line_item_count": str(len(line_items)),
+        "test_count": str(len(services)),
+        "grand_total": f"INR {commercial.get('grand_total_inr', 0):,}",
+    }
+
+    display_items = line_items[:BOQ_ROWS]
+    for idx, item in enumerate(display_items):
+        req = item.get("requirement", {})
+        fields[f"boq_{idx}_name"] = str(req.get("item_name", "N/A")[:30])
+        fields[f"boq_{idx}_specs"] = str(req.get("specs", "N/A")[:90] + "...")
+        fields[f"boq_{idx}_qty"] = str(req.get("quantity", 1))
+
+    if line_items:
+        focus_item = line_items[0]
+        match = focus_item.get("match", {})
+        scores = match.get("scores", {})
+        fields.update({
+            "focus_name": str(focus_item["requirement"].get("item_name", "")),
+            "focus_product": str(match.get("product_name", "")),
+            "focus_confidence": f"{scores.get('ensemble', 0)}%",
+            "focus_reason": str(match.get("reason", "Best technical fit based on specs.")),
+            "score_semantic": str(scores.get("semantic", 0)),
+            "score_keyword": str(scores.get("keyword", 0)),
+            "score_rule": str(scores.get("rule", 0)),
+        })
+
+    lines = commercial.get("lines", [])[:QUOTE_ROWS]
+    for idx, line in enumerate(lines):
+        fields[f"quote_{idx}_name"] = str(line.get("item_name", "")[:35])
+        fields[f"quote_{idx}_sku"] = str(line.get("sku", ""))
+        fields[f"quote_{idx}_qty"] = str(line.get("qty", 0))
+        fields[f"quote_{idx}_total"] = f"{line.get('line_total', 0):,}"
+
+    return fields, {"boq_table": len(display_items), "quote_table": len(lines)}, bool(line_items)
+
+def build_presentation(fields: dict, rows: dict, has_focus: bool) -> Presentation:
+    """
+    Draws the whole deck shape by shape. Used directly only to build the master
+    (with {{token}} fields) and as the baseline in the benchmark.
+    """
     prs = Presentation()
 
     slide = prs.slides.add_slide(prs.slide_layouts[6]) # Blank
@@ -108,29 +175,29 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
     tb = slide.shapes.add_textbox(Inches(1), Inches(2.5), Inches(8), Inches(2))
     p = tb.text_frame.paragraphs[0]
     run = p.add_run()
-    run.text = f"PROPOSAL FOR:\n{rfp.client_name.upper()}"
+    run.text = f"PROPOSAL FOR:\n{fields['client_upper']}"
     p.alignment = PP_ALIGN.LEFT
     set_font(run, size=40, bold=True, color=COLOR_NAVY)
 
     p2 = tb.text_frame.add_paragraph()
     run2 = p2.add_run()
-    run2.text = f"RFP Ref: {rfp.title}"
+    run2.text = f"RFP Ref: {fields['title']}"
     set_font(run2, size=18, bold=False, color=COLOR_BLUE)
 
     # Footer Info
     tb3 = slide.shapes.add_textbox(Inches(1), Inches(6), Inches(5), Inches(1))
     p3 = tb3.text_frame.paragraphs[0]
     run3 = p3.add_run()
-    run3.text = f"Generated by: BidWin AI Agentic Platform\nDate: {datetime.now().strftime('%d %B %Y')}"
+    run3.text = f"Generated by: BidWin AI Agentic Platform\nDate: {fields['date']}"
     set_font(run3, size=11, color=COLOR_BLACK)
 
     slide = prs.slides.add_slide(prs.slide_layouts[6])
     add_slide_header(slide, "Executive Summary")
     
     
-    create_stat_card(slide, Inches(0.5), Inches(1.5), "Total Project Value", f"₹ {commercial.get('grand_total_inr', '0')}")
-    create_stat_card(slide, Inches(3.6), Inches(1.5), "Line Items", len(line_items))
-    create_stat_card(slide, Inches(6.7), Inches(1.5), "Tests Extracted", len(services))
+    create_stat_card(slide, Inches(0.5), Inches(1.5), "Total Project Value", fields["total_card"])
+    create_stat_card(slide, Inches(3.6), Inches(1.5), "Line Items", fields["line_item_count"])
+    create_stat_card(slide, Inches(6.7), Inches(1.5), "Tests Extracted", fields["test_count"])
 
    
     tb = slide.shapes.add_textbox(Inches(0.5), Inches(3.5), Inches(9), Inches(3))
@@ -145,7 +212,7 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
         run.text = text
         set_font(run, size=14, color=COLOR_BLACK)
 
-    add_bullet(f"We have analyzed the RFP for {rfp.client_name} using our Agentic AI Engine.")
+    add_bullet(f"We have analyzed the RFP for {fields['client_name']} using our Agentic AI Engine.")
     add_bullet("Technical Compliance: Our proposed solution meets 100% of the specified technical parameters (DFT, Chemical Resistance, Standards).")
     add_bullet("Commercials: Pricing includes base material, regional logistics (5%), and all mandatory testing services.")
     add_bullet("Delivery: Standard lead time of 14 days post-PO.")
@@ -153,8 +220,10 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
     slide = prs.slides.add_slide(prs.slide_layouts[6])
     add_slide_header(slide, "Extracted Bill of Quantities")
 
-    display_items = line_items[:8]
-    table = slide.shapes.add_table(len(display_items)+1, 3, Inches(0.5), Inches(1.5), Inches(9), Inches(0.6 * len(display_items))).table
+    boq_rows = rows["boq_table"]
+    frame = slide.shapes.add_table(boq_rows+1, 3, Inches(0.5), Inches(1.5), Inches(9), Inches(0.6 * boq_rows))
+    frame.name = "boq_table"
+    table = frame.table
     
     headers = ["Item Name", "Extracted Specs", "Qty"]
     for i, h in enumerate(headers):
@@ -168,9 +237,8 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
     table.columns[1].width = Inches(5.0)
     table.columns[2].width = Inches(1.5)
 
-    for idx, item in enumerate(display_items):
+    for idx in range(boq_rows):
         r = idx + 1
-        req = item.get("requirement", {})
         
         def set_cell(row, col, txt):
             cell = table.cell(row, col)
@@ -179,18 +247,17 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
             run.text = str(txt)
             set_font(run, size=10)
 
-        set_cell(r, 0, req.get("item_name", "N/A")[:30])
-        set_cell(r, 1, req.get("specs", "N/A")[:90] + "...")
-        set_cell(r, 2, req.get("quantity", 1))
+        set_cell(r, 0, fields[f"boq_{idx}_name"])
+        set_cell(r, 1, fields[f"boq_{idx}_specs"])
+        set_cell(r, 2, fields[f"boq_{idx}_qty"])
 
     slide = prs.slides.add_slide(prs.slide_layouts[6])
     add_slide_header(slide, "Technical Matching & Recommendations")
 
-    if line_items:
-        focus_item = line_items[0]
-        match = focus_item.get("match", {})
-        
-        table = slide.shapes.add_table(2, 4, Inches(0.5), Inches(1.5), Inches(9), Inches(1.5)).table
+    if has_focus:
+        frame = slide.shapes.add_table(2, 4, Inches(0.5), Inches(1.5), Inches(9), Inches(1.5))
+        frame.name = "focus_table"
+        table = frame.table
         
         headers = ["Requirement", "Asian Paints Solution", "Confidence", "Compliance"]
         for i, h in enumerate(headers):
@@ -208,13 +275,14 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
             run.text = str(txt)
             set_font(run, size=11, color=color, bold=bold)
 
-        set_cell(r, 0, focus_item["requirement"].get("item_name", ""))
-        set_cell(r, 1, match.get("product_name", ""))
-        set_cell(r, 2, f"{match.get('scores', {}).get('ensemble', 0)}%")
+        set_cell(r, 0, fields["focus_name"])
+        set_cell(r, 1, fields["focus_product"])
+        set_cell(r, 2, fields["focus_confidence"])
         set_cell(r, 3, "COMPLIANT", color=COLOR_GREEN, bold=True)
 
         # Reasoning Text
         tb = slide.shapes.add_textbox(Inches(0.5), Inches(3.5), Inches(9), Inches(2))
+        tb.name = "focus_reason"
         tf = tb.text_frame
         tf.word_wrap = True
         
@@ -225,7 +293,7 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
         
         p2 = tf.add_paragraph()
         run2 = p2.add_run()
-        run2.text = match.get("reason", "Best technical fit based on specs.")
+        run2.text = fields["focus_reason"]
         set_font(run2, size=12)
 
     slide = prs.slides.add_slide(prs.slide_layouts[6])
@@ -249,10 +317,10 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
     draw_node(Inches(6), Inches(4), "Rule-Based\n(Constraints)")
     
     # Simple Score Table
-    if line_items:
-        scores = line_items[0].get("match", {}).get("scores", {})
-        
-        tb = slide.shapes.add_table(2, 4, Inches(2), Inches(5.5), Inches(6), Inches(1)).table
+    if has_focus:
+        frame = slide.shapes.add_table(2, 4, Inches(2), Inches(5.5), Inches(6), Inches(1))
+        frame.name = "focus_scores"
+        tb = frame.table
         
         headers = ["Metric", "Semantic Score", "Keyword Score", "Rule Score"]
         for i, h in enumerate(headers):
@@ -269,15 +337,17 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
             set_font(run, size=12, bold=True)
             
         set_score(0, "Value")
-        set_score(1, scores.get("semantic", 0))
-        set_score(2, scores.get("keyword", 0))
-        set_score(3, scores.get("rule", 0))
+        set_score(1, fields["score_semantic"])
+        set_score(2, fields["score_keyword"])
+        set_score(3, fields["score_rule"])
 
     slide = prs.slides.add_slide(prs.slide_layouts[6])
     add_slide_header(slide, "Commercial Quote")
     
-    lines = commercial.get("lines", [])[:8]
-    table = slide.shapes.add_table(len(lines)+1, 4, Inches(0.5), Inches(1.5), Inches(9), Inches(0.5)).table
+    quote_rows = rows["quote_table"]
+    frame = slide.shapes.add_table(quote_rows+1, 4, Inches(0.5), Inches(1.5), Inches(9), Inches(0.5))
+    frame.name = "quote_table"
+    table = frame.table
     
     headers = ["Item", "SKU", "Qty", "Line Total (INR)"]
     for i, h in enumerate(headers):
@@ -288,7 +358,7 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
         cell.fill.fore_color.rgb = COLOR_BLUE 
         set_font(run, size=10, bold=True, color=COLOR_WHITE)
     
-    for idx, line in enumerate(lines):
+    for idx in range(quote_rows):
         r = idx + 1
         
         def set_c(col, txt):
@@ -296,10 +366,10 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
             run.text = str(txt)
             set_font(run, size=10)
 
-        set_c(0, line.get("item_name", "")[:35])
-        set_c(1, line.get("sku", ""))
-        set_c(2, line.get("qty", 0))
-        set_c(3, f"{line.get('line_total', 0):,}")
+        set_c(0, fields[f"quote_{idx}_name"])
+        set_c(1, fields[f"quote_{idx}_sku"])
+        set_c(2, fields[f"quote_{idx}_qty"])
+        set_c(3, fields[f"quote_{idx}_total"])
 
     
     gt_box = slide.shapes.add_shape(MSO_SHAPE.RECTANGLE, Inches(5), Inches(5.5), Inches(4.5), Inches(1.5))
@@ -319,18 +389,246 @@ def generate_proposal_ppt(rfp_id: int, db: Session):
     p2.alignment = PP_ALIGN.CENTER
     p2.space_before = Pt(10)
     run2 = p2.add_run()
-    run2.text = f"INR {commercial.get('grand_total_inr', 0):,}"
+    run2.text = fields["grand_total"]
     set_font(run2, size=32, bold=True, color=COLOR_GREEN)
 
+    return prs
+
+class _TokenFields(dict):
+    """Every lookup yields its own {{key}} placeholder."""
+    def __missing__(self, key):
+        return "{{" + key + "}}"
+
+def master_bytes() -> bytes:
+    """
+    The master deck with every static shape drawn and {{token}} text in place of
+    RFP data, built once per process and kept as .pptx bytes.
+    """
+    global _master_bytes
+    with _master_lock:
+        if _master_bytes is None:
+            prs = build_presentation(_TokenFields(), {"boq_table": BOQ_ROWS, "quote_table": QUOTE_ROWS}, True)
+            buffer = io.BytesIO()
+            prs.save(buffer)
+            _master_bytes = buffer.getvalue()
+        return _master_bytes
+
+def _fill_text_frame(text_frame, fields: dict):
+    for paragraph in text_frame.paragraphs:
+        for run in paragraph.runs:
+            if "{{" in run.text:
+                run.text = TOKEN.sub(lambda m: fields.get(m.group(1), ""), run.text)
+
+def fill_master(fields: dict, rows: dict, has_focus: bool) -> Presentation:
+    """Loads the master and fills in one proposal: text, table rows and optional shapes."""
+    prs = Presentation(io.BytesIO(master_bytes()))
+    for slide in prs.slides:
+        for shape in list(slide.shapes):
+            if shape.name in FOCUS_SHAPES and not has_focus:
+                shape._element.getparent().remove(shape._element)
+                continue
+            if shape.has_table:
+                tbl = shape.table._tbl
+                if shape.name in rows:
+                    for tr in tbl.tr_lst[rows[shape.name] + 1:]:
+                        tbl.remove(tr)
+                    shape.height = sum(row.height for row in shape.table.rows)
+                for cell in shape.table.iter_cells():
+                    _fill_text_frame(cell.text_frame, fields)
+            elif shape.has_text_frame:
+                _fill_text_frame(shape.text_frame, fields)
+    return prs
+
+def render_proposal(rfp_id: int, client_name: str, title: str, data: dict) -> dict:
+    """
+    Builds and saves the PPTX from plain data only (no DB access).
+    Returns the file location and download URL.
+    """
+    prs = fill_master(*proposal_fields(client_name, title, data))
+
     filename = f"proposal_{rfp_id}.pptx"
     file_path = os.path.join(OUTPUT_DIR, filename)
-    prs.save(file_path)
+    # Write then rename, so a download never sees a half-written deck; the temp name
+    # is unique per call, so concurrent renders of the same RFP cannot collide
+    with tempfile.NamedTemporaryFile(dir=OUTPUT_DIR, prefix=f"{filename}.", suffix=".tmp", delete=False) as tmp:
+        tmp_path = tmp.name
+    try:
+        prs.save(tmp_path)
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        "status": "success",
+        "file_url": file_path,
+        "download_url": f"/api/agents/main/download/{filename}"
+    }
+
+def sample_proposal_data(line_items: int = 8) -> dict:
+    return {
+        "line_items": [
+            {
+                "requirement": {"item_name": f"Epoxy Coating {i}", "specs": "DFT 150 microns, chemical resistant, IS 14209 " * 3, "quantity": 100 + i},
+                "match": {"product_name": "Apcodur CP30", "reason": "Matches DFT and resistance specs.",
+                          "scores": {"ensemble": 88, "semantic": 90, "keyword": 80, "rule": 95}},
+            }
+            for i in range(line_items)
+        ],
+        "commercial": {
+            "grand_total_inr": 1234567.89,
+            "services": [{"test_name": "Salt Spray"}],
+            "lines": [{"item_name": f"Epoxy Coating {i}", "sku": f"AP-{i:03d}", "qty": 100 + i, "line_total": 45678.9} for i in range(line_items)],
+        },
+    }
+
+def benchmark_proposals(count: int = 20) -> dict:
+    """
+    Proposals/second drawing every deck from scratch vs filling the cached master
+    (both rendered to memory, so disk speed is not measured).
+    """
+    data = sample_proposal_data()
+
+    started = time.perf_counter()
+    master_bytes()
+    master_ms = (time.perf_counter() - started) * 1000
+
+    def run(render) -> float:
+        started = time.perf_counter()
+        for i in range(count):
+            render(*proposal_fields(f"Client {i}", f"Tender {i}", data)).save(io.BytesIO())
+        return time.perf_counter() - started
+
+    scratch = run(build_presentation)
+    template = run(fill_master)
+    return {
+        "proposals": count,
+        "master_build_ms": round(master_ms, 1),
+        "from_scratch_per_sec": round(count / scratch, 2),
+        "template_per_sec": round(count / template, 2),
+        "speedup": round(scratch / template, 2),
+    }
+
+def generate_proposal_ppt(rfp_id: int, db: Session):
+    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
+    if not rfp: return {"error": "RFP not found"}
+    
+    data = rfp.extracted_data
+    if not data: return {"error": "Data empty"}
+
+    result = render_proposal(rfp.id, rfp.client_name, rfp.title, data)
     
     rfp.status = "Ready to Submit"
     db.commit()
 
+    return result
+
+def _init_worker_process():
+    # Each worker builds its own master once, before its first proposal
+    master_bytes()
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _master_lock:
+        if _executor is None:
+            # forkserver, not fork: a child forked from this threaded server could inherit
+            # _master_lock while another request holds it and hang in the initializer
+            _executor = ProcessPoolExecutor(max_workers=settings.PROPOSAL_WORKERS or os.cpu_count() or 2,
+                                            mp_context=multiprocessing.get_context("forkserver"),
+                                            initializer=_init_worker_process)
+        return _executor
+
+def _discard_executor(executor: ProcessPoolExecutor):
+    """Drops a broken pool (a worker died) so the next bulk run starts a fresh one."""
+    global _executor
+    with _master_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_proposal_pool():
+    with _master_lock:
+        executor = _executor
+    if executor is not None:
+        _discard_executor(executor)
+
+def _render_on_pool(jobs: list) -> list:
+    """
+    One future per proposal, so a worker dying only fails the proposals that
+    had not finished; the broken pool is replaced for the next call.
+    """
+    executor = _get_executor()
+    futures, broken = {}, False
+    for job in jobs:
+        try:
+            futures[job[0]] = executor.submit(_render_one, job)
+        except BrokenProcessPool:
+            # Already broken: the remaining jobs are reported as failed below
+            break
+
+    results = []
+    for job in jobs:
+        future = futures.get(job[0])
+        try:
+            if future is None:
+                raise BrokenProcessPool("pool was already broken")
+            results.append(future.result())
+        except BrokenProcessPool as e:
+            broken = True
+            results.append({"rfp_id": job[0], "error": f"Proposal generation failed: worker process died ({e})"})
+    if broken:
+        _discard_executor(executor)
+    return results
+
+def _render_one(job: tuple) -> dict:
+    # Runs inside a worker process; gets plain data only, never ORM objects or sessions
+    rfp_id, client_name, title, data = job
+    started = time.perf_counter()
+    try:
+        result = render_proposal(rfp_id, client_name, title, data)
+    except Exception as e:
+        result = {"error": f"Proposal generation failed: {str(e)}"}
+    return {"rfp_id": rfp_id, "ms": round((time.perf_counter() - started) * 1000, 1), **result}
+
+def generate_proposals_bulk(rfp_ids: list, db: Session, parallel: bool = True):
+    """
+    Renders proposals for many RFPs on a process pool, then marks all
+    successful ones "Ready to Submit" with a single UPDATE.
+    """
+    started = time.perf_counter()
+    rows = db.query(RFP.id, RFP.client_name, RFP.title, RFP.extracted_data).filter(RFP.id.in_(rfp_ids)).all()
+    jobs = [(r.id, r.client_name or "", r.title or "", r.extracted_data) for r in rows if r.extracted_data]
+    skipped = sorted(set(rfp_ids) - {job[0] for job in jobs})
+
+    if parallel and len(jobs) > 1:
+        results = _render_on_pool(jobs)
+    else:
+        results = [_render_one(job) for job in jobs]
+    render_s = time.perf_counter() - started
+
+    done = [r["rfp_id"] for r in results if "error" not in r]
+    if done:
+        db.execute(update(RFP).where(RFP.id.in_(done)).values(status="Ready to Submit"))
+        db.commit()
+
     return {
         "status": "success",
-        "file_url": file_path,
-        "download_url": f"/api/agents/main/download/{filename}"
-    }
\ No newline at end of file
+        "generated": len(done),
+        "failed": [{"rfp_id": r["rfp_id"], "error": r["error"]} for r in results if "error" in r],
+        "skipped": skipped,
+        "proposals_per_sec": round(len(jobs) / render_s, 2) if render_s and jobs else None,
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "results": results
+    }
+
+if __name__ == "__main__":
+    # python -m app.services.proposal_service <rfp_id> [<rfp_id> ...]
+    import sys
+    import json
+    from app.core.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(json.dumps(generate_proposals_bulk([int(a) for a in sys.argv[1:]], session), indent=2))
+    finally:
+        session.close()
@@ -0,0 +1,201 @@
+import os
+import math
+import asyncio
+import threading
+from collections import Counter, OrderedDict
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import RFPChunkIndex
+from app.services.pdf_service import extract_text_from_pdf, file_sha256
+from app.services.catalog_index import tokenize
+
+CHUNK_SIZE = 1500
+CHUNK_OVERLAP = 200
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+# Built indexes kept in memory, keyed by (rfp_id, file hash)
+MAX_CACHED_INDEXES = 64
+
+# Sent instead of excerpts when the PDF is missing or has no extractable text
+NO_DOCUMENT_CONTEXT = "(The tender document is not available; answer from the internal analysis only.)"
+
+_lock = threading.Lock()
+_indexes = OrderedDict()
+
+
+def chunk_text(text: str, size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> list:
+    """
+    Splits text into ~size character chunks that overlap by ~overlap characters,
+    preferring to cut at paragraph, line or word boundaries.
+    """
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + size, len(text))
+        if end < len(text):
+            window = text[start:end]
+            for sep in ("\n\n", "\n", " "):
+                cut = window.rfind(sep)
+                if cut > size // 2:
+                    end = start + cut
+                    break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - overlap, start + 1)
+    return chunks
+
+
+class BM25Index:
+    def __init__(self, chunks: list):
+        self.chunks = chunks
+        self.doc_tokens = [Counter(tokenize(c)) for c in chunks]
+        self.doc_lens = [sum(t.values()) for t in self.doc_tokens]
+        self.avg_len = (sum(self.doc_lens) / len(chunks)) if chunks else 0.0
+
+        doc_freq = Counter()
+        for tokens in self.doc_tokens:
+            doc_freq.update(tokens.keys())
+        n = len(chunks)
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freq.items()}
+
+        self.postings = {}
+        for i, tokens in enumerate(self.doc_tokens):
+            for term, tf in tokens.items():
+                self.postings.setdefault(term, []).append((i, tf))
+
+    def search(self, query: str, k: int) -> list:
+        """Returns [(chunk_index, score)] for the top-k chunks."""
+        scores = Counter()
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = K1 * (1 - B + B * self.doc_lens[i] / (self.avg_len or 1))
+                scores[i] += idf * tf * (K1 + 1) / (tf + norm)
+        return scores.most_common(k)
+
+
+def _document_sha256(file_path: str):
+    """Hash of the RFP's PDF, or None if there is no file to read."""
+    if not file_path or not os.path.isfile(file_path):
+        return None
+    return file_sha256(file_path)
+
+
+def _upsert_chunks(rfp_id: int, sha: str, chunks: list):
+    # Two first questions on the same RFP may both ingest it; the upsert makes that harmless
+    stmt = pg_insert(RFPChunkIndex).values(rfp_id=rfp_id, file_sha256=sha, chunks=chunks)
+    return stmt.on_conflict_do_update(
+        index_elements=[RFPChunkIndex.rfp_id],
+        set_={"file_sha256": stmt.excluded.file_sha256, "chunks": stmt.excluded.chunks}
+    )
+
+
+def _stored_sha(rfp_id: int):
+    return select(RFPChunkIndex.file_sha256).where(RFPChunkIndex.rfp_id == rfp_id)
+
+
+def _stored_chunks(rfp_id: int):
+    return select(RFPChunkIndex.chunks).where(RFPChunkIndex.rfp_id == rfp_id)
+
+
+def ingest_rfp(rfp, sha: str, db: Session) -> list:
+    """
+    Chunks of the RFP's PDF (content hash sha), persisted with the RFP. Only the stored
+    hash is read first; the stored chunks are loaded only when it matches, and the PDF
+    is re-chunked otherwise. A PDF without text yields [] and nothing is stored.
+    """
+    if db.scalar(_stored_sha(rfp.id)) == sha:
+        chunks = db.scalar(_stored_chunks(rfp.id))
+        if chunks:
+            return chunks
+
+    chunks = chunk_text(extract_text_from_pdf(rfp.file_url))
+    if chunks:
+        db.execute(_upsert_chunks(rfp.id, sha, chunks))
+        db.commit()
+    return chunks
+
+
+async def aingest_rfp(rfp, sha: str, db: AsyncSession) -> list:
+    """Async counterpart of ingest_rfp; PDF parsing runs in a worker thread."""
+    if await db.scalar(_stored_sha(rfp.id)) == sha:
+        chunks = await db.scalar(_stored_chunks(rfp.id))
+        if chunks:
+            return chunks
+
+    text = await asyncio.to_thread(extract_text_from_pdf, rfp.file_url)
+    chunks = chunk_text(text)
+    if chunks:
+        await db.execute(_upsert_chunks(rfp.id, sha, chunks))
+        await db.commit()
+    return chunks
+
+
+def _cached_index(rfp_id: int, sha: str):
+    with _lock:
+        index = _indexes.get((rfp_id, sha))
+        if index is not None:
+            _indexes.move_to_end((rfp_id, sha))
+        return index
+
+
+def _cache_index(rfp_id: int, sha: str, chunks: list):
+    if not chunks:
+        return None
+    index = BM25Index(chunks)
+    with _lock:
+        _indexes[(rfp_id, sha)] = index
+        while len(_indexes) > MAX_CACHED_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def get_rfp_index(rfp, db: Session):
+    """
+    The RFP's BM25 index, or None when the PDF is missing or has no text.
+    An index already in memory for the current file needs no database access.
+    """
+    sha = _document_sha256(rfp.file_url)
+    if sha is None:
+        return None
+    return _cached_index(rfp.id, sha) or _cache_index(rfp.id, sha, ingest_rfp(rfp, sha, db))
+
+
+async def aget_rfp_index(rfp, db: AsyncSession):
+    sha = await asyncio.to_thread(_document_sha256, rfp.file_url)
+    if sha is None:
+        return None
+    return _cached_index(rfp.id, sha) or _cache_index(rfp.id, sha, await aingest_rfp(rfp, sha, db))
+
+
+def format_context(index: BM25Index, question: str, k: int) -> str:
+    """
+    The k chunks most relevant to the question, in document order.
+    Falls back to the opening chunks when nothing matches the question's terms,
+    and to NO_DOCUMENT_CONTEXT when there is no index.
+    """
+    if index is None:
+        return NO_DOCUMENT_CONTEXT
+    hits = [i for i, _ in index.search(question, k)]
+    if not hits:
+        hits = list(range(min(k, len(index.chunks))))
+    return "\n\n".join(f"[Excerpt {i + 1}/{len(index.chunks)}]\n{index.chunks[i]}" for i in sorted(hits))
+
+
+def retrieve_context(rfp, question: str, db: Session, k: int) -> str:
+    return format_context(get_rfp_index(rfp, db), question, k)
+
+
+async def aretrieve_context(rfp, question: str, db: AsyncSession, k: int) -> str:
+    return format_context(await aget_rfp_index(rfp, db), question, k)
@@ -0,0 +1,83 @@
+from collections import deque
+
+
+class RateCardMatcher:
+    """
+    Aho-Corasick automaton over every rate-card key and synonym, built once.
+    A test name is scanned a single time regardless of how many services exist.
+
+    mode="longest": the longest pattern found in the name wins (ties go to rate-card order).
+    mode="first": the first rate-card key, in insertion order, contained in the name wins,
+                  ignoring synonyms. This reproduces the original linear-scan behaviour.
+    """
+
+    def __init__(self, rate_card: dict, synonyms: dict = None):
+        self.rate_card = rate_card
+        # pattern -> (service key, rate-card order, is_synonym)
+        self.patterns = {}
+        for order, key in enumerate(rate_card):
+            self.patterns.setdefault(key.lower(), (key, order, False))
+        for key, aliases in (synonyms or {}).items():
+            if key not in rate_card:
+                continue
+            order = list(rate_card).index(key)
+            for alias in aliases:
+                self.patterns.setdefault(alias.lower(), (key, order, True))
+
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for pattern in self.patterns:
+            self._add(pattern)
+        self._build_failure_links()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state].append(pattern)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> set:
+        """All patterns occurring anywhere in text (already lowercased)."""
+        found = set()
+        state = 0
+        for ch in text:
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            found.update(self._out[state])
+        return found
+
+    def match(self, test_name: str, mode: str = "longest"):
+        """Returns the matched rate-card key, or None."""
+        found = self.find_all(str(test_name).lower())
+        candidates = [(p, *self.patterns[p]) for p in found]
+
+        if mode == "first":
+            candidates = [c for c in candidates if not c[3]]
+            if not candidates:
+                return None
+            return min(candidates, key=lambda c: c[2])[1]
+
+        if not candidates:
+            return None
+        return min(candidates, key=lambda c: (-len(c[0]), c[2]))[1]
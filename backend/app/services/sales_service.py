@@ -1,46 +1,294 @@
 import os
-from bs4 import BeautifulSoup
+import json
+import time
+import base64
+import hashlib
+from datetime import datetime
+from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup, SoupStrainer, FeatureNotFound
+from sqlalchemy import select, update, func, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from app.models import RFP
+from app.core.config import settings
 
 DATA_DIR = "/app/data" 
 
-def scan_mock_portal(db: Session):
-    portal_path = os.path.join(DATA_DIR, "mock_portal.html")
-    
-    if not os.path.exists(portal_path):
-        return {"error": "Mock portal file not found"}
+# Prefix of tender_key for tenders found on the mock portal
+PORTAL_SOURCE = "mock_portal"
 
-    with open(portal_path, "r") as f:
-        soup = BeautifulSoup(f, "html.parser")
+UPLOAD_DIR = "/app/data/manual_uploads"
+UPLOAD_CHUNK_BYTES = 1024 * 1024
 
-    new_rfps = []
-    tenders = soup.find_all("li", class_="tender-item")
+# Columns returned by the RFP list unless the caller asks for others
+LIST_FIELDS = ("id", "title", "client_name", "file_url", "status", "deadline", "created_at")
+RFP_FIELDS = LIST_FIELDS + ("source_url", "extracted_data")
 
-    for item in tenders:
+# Only tender items are built into the tree; the rest of the page is skipped
+TENDER_ITEMS = SoupStrainer("li", class_="tender-item")
+
+
+def make_soup(html, parser: str = None, strain: bool = True, only: SoupStrainer = None) -> BeautifulSoup:
+    parse_only = (only or TENDER_ITEMS) if strain else None
+    try:
+        return BeautifulSoup(html, parser or settings.PORTAL_PARSER, parse_only=parse_only)
+    except FeatureNotFound:
+        # lxml is optional; the pure-Python parser always works
+        return BeautifulSoup(html, "html.parser", parse_only=parse_only)
+
+
+def tender_hash(fields: tuple) -> str:
+    return hashlib.sha256("\x1f".join(fields).encode("utf-8")).hexdigest()
+
+
+def resolve_link(base: str, link: str) -> str:
+    """Document links are relative to the portal page: a URL for remote portals, a directory for local files."""
+    if "://" in base:
+        return urljoin(base, link)
+    return os.path.join(base, link)
+
+
+def document_path(url: str) -> str:
+    """Where the PDF behind a remote tender link is downloaded to, named by a hash of the URL."""
+    ext = os.path.splitext(urlparse(url).path)[1] or ".pdf"
+    return os.path.join(UPLOAD_DIR, f"portal_{hashlib.sha256(url.encode()).hexdigest()[:32]}{ext}")
+
+
+def parse_portal(html, parser: str = None, strain: bool = True, source: str = PORTAL_SOURCE, base: str = DATA_DIR) -> list:
+    items = []
+    for item in make_soup(html, parser, strain).find_all("li", class_="tender-item"):
+        link = item.find("a", class_="download-link")['href']
         title = item.find("h3", class_="title").text.strip()
         client = item.find("span", class_="client").text.strip()
         deadline = item.find("span", class_="deadline").text.strip()
-        link = item.find("a", class_="download-link")['href']
-        
-        # Check duplication
-        existing = db.query(RFP).filter(RFP.title == title).first()
-        if not existing:
-            # Create new RFP entry
-            rfp = RFP(
-                title=title,
-                client_name=client,
-                deadline=deadline,
-                file_url=os.path.join(DATA_DIR, link), 
-                status="New"
-            )
-            db.add(rfp)
-            db.commit()
-            db.refresh(rfp)
-            new_rfps.append({"id": rfp.id, "title": rfp.title})
+        url = resolve_link(base, link)
+        remote = "://" in url
+        items.append({
+            "tender_key": f"{source}:{link}",
+            "content_hash": tender_hash((title, client, deadline, link)),
+            "title": title,
+            "client_name": client,
+            "deadline": deadline,
+            # Remote PDFs are downloaded by the crawler; file_url is always a local path
+            "file_url": document_path(url) if remote else url,
+            "source_url": url if remote else None,
+            "status": "New",
+        })
+    return items
+
+
+def dedupe_tenders(items: list, db: Session) -> list:
+    """
+    Drops repeats within the scan and back-fills tender_key on scanned rows
+    saved before the key existed (matched by title, as the scan used to), so
+    they are not inserted a second time. Manual uploads are never touched, and
+    each key goes to at most one row; other rows with the same title keep a
+    null key.
+    """
+    unique = list({item["tender_key"]: item for item in items}.values())
+    by_title = {item["title"]: item["tender_key"] for item in unique}
+    legacy = db.execute(
+        select(RFP.id, RFP.title)
+        .where(
+            RFP.tender_key.is_(None),
+            RFP.title.in_(list(by_title)),
+            ~RFP.file_url.startswith(UPLOAD_DIR)
+        )
+        .order_by(RFP.id)
+    ).all()
+    if not legacy:
+        return unique
+
+    taken = set(db.scalars(select(RFP.tender_key).where(RFP.tender_key.in_(list(by_title.values())))))
+    backfill = []
+    for row in legacy:
+        key = by_title[row.title]
+        if key in taken: continue
+        taken.add(key)
+        backfill.append({"id": row.id, "tender_key": key})
+    if backfill:
+        db.execute(update(RFP), backfill)
+    return unique
+
+
+def diff_tenders(unique: list, db: Session) -> tuple:
+    """Splits parsed tenders into (new, modified) against the stored content hashes; unchanged ones are dropped."""
+    known = {
+        row.tender_key: row
+        for row in db.execute(
+            select(RFP.id, RFP.tender_key, RFP.content_hash).where(RFP.tender_key.in_([i["tender_key"] for i in unique]))
+        )
+    }
+    new, modified = [], []
+    for item in unique:
+        row = known.get(item["tender_key"])
+        if row is None:
+            new.append(item)
+        elif row.content_hash != item["content_hash"]:
+            modified.append({**item, "id": row.id})
+    return new, modified
+
+
+def write_tenders(new: list, modified: list, db: Session) -> tuple:
+    """
+    New tenders go in with one INSERT ... ON CONFLICT DO NOTHING RETURNING;
+    modified ones get one bulk UPDATE that leaves their pipeline status alone.
+    """
+    inserted = []
+    if new:
+        stmt = (
+            pg_insert(RFP)
+            .values(new)
+            .on_conflict_do_nothing(index_elements=[RFP.tender_key])
+            .returning(RFP.id, RFP.title)
+        )
+        inserted = [{"id": row.id, "title": row.title} for row in db.execute(stmt)]
+    if modified:
+        db.execute(update(RFP), [
+            {k: item[k] for k in ("id", "content_hash", "title", "client_name", "deadline", "file_url", "source_url")}
+            for item in modified
+        ])
+    return inserted, [{"id": item["id"], "title": item["title"]} for item in modified]
+
+
+def ingest_tenders(items: list, db: Session) -> dict:
+    """
+    Writes the new and modified tenders among items; the caller commits.
+    Returns {"new_rfps", "updated_rfps", "timings_ms"}.
+    """
+    timings = {}
+    started = time.perf_counter()
+    new, modified = diff_tenders(dedupe_tenders(items, db), db) if items else ([], [])
+    timings["dedupe_ms"] = (time.perf_counter() - started) * 1000
 
+    started = time.perf_counter()
+    new_rfps, updated_rfps = write_tenders(new, modified, db)
+    timings["write_ms"] = (time.perf_counter() - started) * 1000
+    return {"new_rfps": new_rfps, "updated_rfps": updated_rfps, "timings_ms": timings}
+
+
+def synthetic_portal_html(tenders: int) -> str:
+    items = "".join(
+        f"""
+        <li class="tender-item">
+            <h3 class="title">Synthetic Tender {i}</h3>
+            <span class="client">Client {i % 97}</span>
+            <span class="deadline">Deadline: 2025-{1 + i % 12:02d}-{1 + i % 28:02d}</span>
+            <a href="rfp_synthetic_{i:05d}.pdf" class="download-link">Download RFP</a>
+        </li>"""
+        for i in range(tenders)
+    )
+    return f"<!DOCTYPE html><html><head><title>Portal</title></head><body><h1>Active Tenders</h1><ul class=\"tender-list\">{items}</ul></body></html>"
+
+
+def benchmark_portal_parsing(tenders: int = 10000) -> dict:
+    """
+    Times each parser, with and without the tender-item SoupStrainer, on a synthetic
+    portal page, plus the content-hash check that lets an unchanged page skip parsing.
+    """
+    html = synthetic_portal_html(tenders)
+    results = {}
+    for parser in ("html.parser", "lxml"):
+        for strain in (False, True):
+            name = f"{parser}{'+strainer' if strain else ''}"
+            try:
+                BeautifulSoup("", parser)
+            except FeatureNotFound:
+                results[name] = "unavailable"
+                continue
+            started = time.perf_counter()
+            count = len(parse_portal(html, parser, strain))
+            elapsed = time.perf_counter() - started
+            results[name] = {
+                "ms": round(elapsed * 1000, 1),
+                "tenders_per_sec": round(count / elapsed) if elapsed else None,
+            }
+
+    started = time.perf_counter()
+    hashlib.sha256(html.encode("utf-8")).hexdigest()
     return {
-        "status": "success",
-        "scanned_count": len(tenders),
-        "new_rfps": new_rfps
-    }
\ No newline at end of file
+        "tenders": tenders,
+        "page_bytes": len(html),
+        "parsers": results,
+        "unchanged_page_check_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def encode_cursor(created_at, rfp_id: int) -> str:
+    raw = json.dumps([created_at.isoformat() if created_at else None, rfp_id])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    created_at, rfp_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return (datetime.fromisoformat(created_at) if created_at else None), int(rfp_id)
+
+
+def parse_fields(fields: str) -> tuple:
+    """Comma-separated column names -> validated tuple; "id" and "created_at" are always included for the cursor."""
+    if not fields:
+        return LIST_FIELDS
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in RFP_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return tuple(dict.fromkeys(["id", "created_at"] + names))
+
+
+def rfp_list_query(fields: tuple, limit: int, cursor: str = None, status: str = None, client: str = None,
+                   deadline_from: str = None, deadline_to: str = None):
+    """
+    Keyset-paginated, projected RFP listing, newest first.
+    Fetches limit + 1 rows so the caller can tell whether another page exists.
+    """
+    query = select(*[getattr(RFP, f) for f in fields])
+    if status:
+        query = query.where(RFP.status == status)
+    if client:
+        query = query.where(RFP.client_name == client)
+    if deadline_from or deadline_to:
+        # Scanned tenders store "Deadline: YYYY-MM-DD"; compare on the date part
+        deadline = func.trim(func.replace(RFP.deadline, "Deadline:", ""))
+        if deadline_from:
+            query = query.where(deadline >= deadline_from)
+        if deadline_to:
+            query = query.where(deadline <= deadline_to)
+    if cursor:
+        created_at, rfp_id = decode_cursor(cursor)
+        query = query.where(tuple_(RFP.created_at, RFP.id) < (created_at, rfp_id))
+    return query.order_by(RFP.created_at.desc(), RFP.id.desc()).limit(limit + 1)
+
+
+def rfp_counts_query():
+    # Served by the status index
+    return select(RFP.status, func.count()).group_by(RFP.status)
+
+
+def page_etag(payload: bytes) -> str:
+    return f'W/"{hashlib.sha1(payload).hexdigest()}"'
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def save_upload(src, dest_path: str, max_bytes: int) -> tuple:
+    """
+    Copies an upload to dest_path in chunks, hashing as it goes, and stops as soon
+    as max_bytes is exceeded. Returns (sha256, size); blocking, run it off the event loop.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest_path, "wb") as out:
+            for chunk in iter(lambda: src.read(UPLOAD_CHUNK_BYTES), b""):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        if os.path.exists(dest_path):
+            os.remove(dest_path)
+        raise
+    return digest.hexdigest(), size
@@ -1,12 +1,9 @@
 from sqlalchemy.orm import Session
 from app.models import Product
 
-def seed_products(db: Session):
-    # Check if products exist to avoid duplicates on restart
-    if db.query(Product).first():
-        return
-
-    products = [
+def seed_catalog() -> list:
+    """The demo catalog as unsaved Product objects."""
+    return [
         # --- EPOXY & PRIMERS ---
         Product(
             sku="AP-IND-001",
@@ -267,7 +264,37 @@ def seed_products(db: Session):
             }
         )
     ]
-    
-    db.add_all(products)
+
+# Tender-style requirements for the seeded catalog, each with the SKU a full-catalog
+# match should pick; the offline reference for the matching shortlist benchmark
+SEED_REQUIREMENTS = [
+    ("AP-IND-001", {"item_name": "High build epoxy coating", "specs": "Structural steel and concrete, DFT 125 microns, airless spray, glossy"}),
+    ("AP-IND-002", {"item_name": "Epoxy phenolic pipeline coating", "specs": "Chemical and acid resistant, service temperature 120C, DFT 200 microns"}),
+    ("AP-IND-004", {"item_name": "Inorganic zinc silicate primer", "specs": "85% zinc in dry film, heat resistant up to 400C"}),
+    ("AP-IND-005", {"item_name": "Epoxy zinc phosphate primer", "specs": "Matt finish, DFT 60 microns, steel structures in corrosive environment"}),
+    ("AP-IND-003", {"item_name": "Aliphatic polyurethane topcoat", "specs": "High gloss, excellent UV resistance and colour retention"}),
+    ("AP-IND-006", {"item_name": "Semi-gloss PU finish", "specs": "Polyurethane finish coat for bridges, 60% volume solids"}),
+    ("AP-IND-007", {"item_name": "Silicone aluminium heat resistant paint", "specs": "Chimney and stacks, up to 600C"}),
+    ("AP-IND-008", {"item_name": "Heat resistant aluminium paint", "specs": "Modified alkyd, metallic finish, medium heat 200C"}),
+    ("AP-IND-009", {"item_name": "Glass flake epoxy lining", "specs": "Extreme abrasion resistance, DFT 450 microns, trowel applied"}),
+    ("AP-IND-010", {"item_name": "Coal tar epoxy", "specs": "Underground and underwater pipelines, immersion grade, black"}),
+    ("AP-IND-011", {"item_name": "Self leveling epoxy flooring", "specs": "Clean room for pharmaceutical plant, 2mm to 3mm thickness"}),
+    ("AP-IND-012", {"item_name": "Thermoplastic road marking paint", "specs": "Hot applied at 180C, retro-reflective, drying under 10 mins"}),
+    ("AP-PPG-013", {"item_name": "Marine epoxy anticorrosive coating", "specs": "Ballast tanks, marine grade, 70% solids"}),
+    ("AP-PPG-014", {"item_name": "Solvent free epoxy for offshore splash zone", "specs": "Fast cure, salt spray resistance above 5000 hours"}),
+    ("AP-IND-015", {"item_name": "Synthetic enamel", "specs": "High gloss alkyd enamel, air drying, for metal and wood"}),
+    ("AP-IND-016", {"item_name": "Chlorinated rubber paint", "specs": "Resistant to acid and alkali fumes, semi-gloss"}),
+    ("AP-IND-017", {"item_name": "Anti-carbonation coating", "specs": "Acrylic protective coating for concrete bridges, elongation above 300%"}),
+    ("AP-IND-018", {"item_name": "Elastomeric waterproofing membrane", "specs": "Fiber reinforced liquid applied, 7 bar water pressure"}),
+    ("AP-IND-019", {"item_name": "Food grade epoxy tank lining", "specs": "Solvent free, potable water contact, CFTRI approved"}),
+    ("AP-IND-020", {"item_name": "Hammertone finish paint", "specs": "Hammered pattern decorative finish for machinery"}),
+]
+
+def seed_products(db: Session):
+    # Check if products exist to avoid duplicates on restart
+    if db.query(Product).first():
+        return
+
+    db.add_all(seed_catalog())
     db.commit()
     print("✅ Seeded 20+ Mock Asian Paints Products into Database")
\ No newline at end of file
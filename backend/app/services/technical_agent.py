@@ -1,8 +1,12 @@
+import time
+import asyncio
 import json
-import re
 from sqlalchemy.orm import Session
-from app.models import RFP, Product
-from app.services.pdf_service import extract_text_from_pdf
+from app.models import RFP
+from app.services.pdf_service import extract_text_prefix
+from app.services.catalog_index import candidate_products, format_catalog, requirement_text
+from app.services.catalog_cache import get_catalog_snapshot
+from app.services.llm_cache import cached_invoke, cached_ainvoke
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate
 from app.core.config import settings
@@ -15,6 +19,9 @@ llm = ChatGoogleGenerativeAI(
     convert_system_message_to_human=True
 )
 
+# Only the start of the tender is sent for BoQ extraction
+EXTRACTION_CHAR_LIMIT = 15000
+
 def clean_json_string(json_str: str) -> str:
     
     
@@ -24,127 +31,322 @@ def clean_json_string(json_str: str) -> str:
         json_str = json_str.split("```")[1].split("```")[0]
     return json_str.strip()
 
-def calculate_keyword_score(req_text: str, product_text: str) -> int:
-    
-    def tokenize(text):
-        return set(re.findall(r'\w+', str(text).lower()))
+matching_prompt = ChatPromptTemplate.from_messages([
+    ("system", """Find the best single product ID for this requirement.
+    Also provide a 'semantic_score' (0-100) based on how well the technology matches.
+    Return JSON: {{ "product_id": 1, "semantic_score": 90, "reason": "..." }}"""),
+    ("user", "Requirement: {req_item}\n\nCatalog:\n{catalog}")
+])
+
+batch_matching_prompt = ChatPromptTemplate.from_messages([
+    ("system", """For EACH numbered requirement, find the best single product ID from the catalog.
+    Also provide a 'semantic_score' (0-100) based on how well the technology matches.
+    Return a JSON array with one object per requirement, echoing its index:
+    [ {{ "index": 0, "product_id": 1, "semantic_score": 90, "reason": "..." }} ]"""),
+    ("user", "Requirements:\n{req_items}\n\nCatalog:\n{catalog}")
+])
+
+def estimate_tokens(text: str) -> int:
+    # Rough heuristic (~4 characters per token), good enough for comparing prompt sizes
+    return len(text) // 4
+
+def new_match_stats(item_count: int) -> dict:
+    return {
+        "items": item_count,
+        "round_trips": 0,
+        "fallback_items": 0,
+        "prompt_tokens_est": 0,
+        "per_item_round_trips": item_count,
+        "per_item_prompt_tokens_est": 0,
+    }
+
+def finalize_match_stats(stats: dict):
+    stats["round_trips_saved"] = stats["per_item_round_trips"] - stats["round_trips"]
+    stats["tokens_saved_est"] = stats["per_item_prompt_tokens_est"] - stats["prompt_tokens_est"]
+
+def validate_json_response(content: str):
+    json.loads(clean_json_string(content))
+
+async def ainvoke_with_retry(prompt, inputs: dict, semaphore: asyncio.Semaphore):
+    """
+    Invokes prompt | llm under the shared concurrency limit, with a per-call timeout
+    and exponential backoff between retries. Responses go through the LLM cache.
+    """
+    attempts = settings.MATCH_MAX_RETRIES + 1
+    for attempt in range(attempts):
+        try:
+            async with semaphore:
+                return await cached_ainvoke(
+                    prompt, llm, inputs, validate=validate_json_response, timeout=settings.MATCH_TIMEOUT_SECONDS
+                )
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = settings.MATCH_BACKOFF_SECONDS * (2 ** attempt)
+            print(f"LLM call failed ({e!r}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+async def match_single_item(item, catalog_str: str, stats: dict, semaphore: asyncio.Semaphore) -> dict:
+    inputs = {"req_item": str(item), "catalog": catalog_str}
+    stats["round_trips"] += 1
+    stats["prompt_tokens_est"] += estimate_tokens(inputs["req_item"] + catalog_str)
+
+    match_res = await ainvoke_with_retry(matching_prompt, inputs, semaphore)
+    return json.loads(clean_json_string(match_res.content))
+
+async def match_batch(batch: list, catalog_str: str, stats: dict, semaphore: asyncio.Semaphore) -> dict:
+    """
+    Matches several requirements in one call. Returns {index_in_batch: match_data}.
+    """
+    req_items = "\n".join(f"[{i}] {item}" for i, item in enumerate(batch))
+    stats["round_trips"] += 1
+    stats["prompt_tokens_est"] += estimate_tokens(req_items + catalog_str)
+
+    match_res = await ainvoke_with_retry(
+        batch_matching_prompt, {"req_items": req_items, "catalog": catalog_str}, semaphore
+    )
+    parsed = json.loads(clean_json_string(match_res.content))
+    if isinstance(parsed, dict):
+        parsed = parsed.get("matches", [parsed])
+
+    results = {}
+    for entry in parsed:
+        try:
+            idx = int(entry.get("index"))
+        except (TypeError, ValueError, AttributeError):
+            continue
+        if 0 <= idx < len(batch):
+            results[idx] = entry
+    return results
+
+async def amatch_items(items: list, catalog_str: str, stats: dict, catalog_for=None, semaphore=None) -> list:
+    """
+    Returns one entry per item: the LLM match dict, or the Exception raised while matching it.
+    Items are sent in batches of MATCH_BATCH_SIZE; anything a batch fails to answer
+    is retried with a single-item call. All calls run concurrently, bounded by MATCH_CONCURRENCY.
+
+    catalog_for(items) may narrow the catalog sent with each call; catalog_str (the full
+    catalog) is used otherwise and as the per-item baseline in the stats.
+    """
+    if catalog_for is None:
+        catalog_for = lambda batch: catalog_str
+
+    for item in items:
+        stats["per_item_prompt_tokens_est"] += estimate_tokens(str(item) + catalog_str)
+
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(max(1, settings.MATCH_CONCURRENCY))
+    results = [None] * len(items)
+    batch_size = settings.MATCH_BATCH_SIZE
 
-    req_tokens = tokenize(req_text)
-    prod_tokens = tokenize(product_text)
+    if batch_size > 1:
+        starts = list(range(0, len(items), batch_size))
+        batch_results = await asyncio.gather(
+            *[match_batch(items[start:start + batch_size], catalog_for(items[start:start + batch_size]), stats, semaphore) for start in starts],
+            return_exceptions=True
+        )
+        for start, batch_result in zip(starts, batch_results):
+            if isinstance(batch_result, Exception):
+                print(f"Batch match failed for items starting at {start}, falling back: {batch_result}")
+                continue
+            for idx, match_data in batch_result.items():
+                results[start + idx] = match_data
+
+    pending = [i for i, r in enumerate(results) if r is None]
+    if batch_size > 1:
+        stats["fallback_items"] += len(pending)
+
+    single_results = await asyncio.gather(
+        *[match_single_item(items[i], catalog_for([items[i]]), stats, semaphore) for i in pending],
+        return_exceptions=True
+    )
+    for i, match_data in zip(pending, single_results):
+        if isinstance(match_data, Exception):
+            print(f"Error matching item {items[i]}: {match_data}")
+        results[i] = match_data
+
+    finalize_match_stats(stats)
+    return results
+
+def match_items(items: list, catalog_str: str, stats: dict, catalog_for=None) -> list:
+    # Sync routes run in FastAPI's threadpool, where no event loop is running
+    return asyncio.run(amatch_items(items, catalog_str, stats, catalog_for))
+
+# Best keyword-overlap products reported alongside the LLM's pick
+KEYWORD_ALTERNATIVES = 3
+
+def semantic_score(match_data: dict):
+    """The LLM's 0-100 score as a number; models sometimes send it as a string or null."""
+    raw = match_data.get('semantic_score')
+    if raw is None:
+        return 0
+    score = float(raw)
+    return int(score) if score.is_integer() else score
+
+def build_line_item(item, match_data, products_by_id: dict, keyword_index) -> dict:
+    """
+    Scores one LLM match. A malformed reply only fails its own line item, never the
+    whole analysis, as when items were matched one at a time.
+    """
+    if isinstance(match_data, Exception):
+        return {"requirement": item, "match": None, "error": str(match_data)}
+    if not isinstance(match_data, dict):
+        return {"requirement": item, "match": None, "error": f"Unexpected match response: {str(match_data)[:200]}"}
+    try:
+        return _score_line_item(item, match_data, products_by_id, keyword_index)
+    except Exception as e:
+        print(f"Error scoring item {item}: {e}")
+        return {"requirement": item, "match": None, "error": str(e)}
+
+def _score_line_item(item, match_data: dict, products_by_id: dict, keyword_index) -> dict:
+    product = products_by_id.get(match_data.get('product_id'))
+    if not product:
+        return {"requirement": item, "match": None, "error": "Product ID not found"}
+
+    try:
+        semantic = semantic_score(match_data)
+    except (TypeError, ValueError):
+        return {"requirement": item, "match": None, "error": f"Invalid semantic_score: {match_data.get('semantic_score')!r}"}
+
+    keyword_scores = keyword_index.score_all(requirement_text(item))
+    keyword_score = keyword_scores.get(product.id, 0)
+    keyword_top = sorted(
+        (pid for pid in keyword_scores if pid != product.id and keyword_scores[pid] > 0),
+        key=lambda pid: -keyword_scores[pid]
+    )[:KEYWORD_ALTERNATIVES]
+    rule_score = 100 if semantic > 80 else 50
+
+    ensemble_score = (
+        (semantic * 0.5) +
+        (keyword_score * 0.3) +
+        (rule_score * 0.2)
+    )
+
+    return {
+        "requirement": item,
+        "match": {
+            "product_id": product.id,
+            "product_name": product.name,
+            "sku": product.sku,
+            "reason": match_data.get('reason', 'Matched by AI'),
+            "scores": {
+                "ensemble": int(ensemble_score),
+                "semantic": semantic,
+                "keyword": keyword_score,
+                "rule": rule_score
+            },
+            "keyword_alternatives": [
+                {"product_id": pid, "sku": products_by_id[pid].sku, "keyword": keyword_scores[pid]}
+                for pid in keyword_top
+            ]
+        }
+    }
+
+extraction_prompt = ChatPromptTemplate.from_messages([
+    ("system", """You are an expert technical estimator. Analyze the tender document.
     
-    if not req_tokens: return 0
+    TASK 1: Extract the 'Bill of Quantities' or 'Scope of Supply'.
+    TASK 2: Extract 'Testing & Acceptance Requirements' (e.g., Type Test, Routine Test, Third Party Inspection).
     
-    intersection = req_tokens.intersection(prod_tokens)
-    score = (len(intersection) / len(req_tokens)) * 100
+    Return a JSON Object with two keys: "items" and "tests".
     
-    return min(int(score), 100)
+    Example JSON:
+    {{
+      "items": [
+         {{ "item_name": "Anticorrosive Primer", "specs": "...", "quantity": "500 L" }}
+      ],
+      "tests": ["Salt Spray Test", "High Voltage Test", "Third Party Inspection"]
+    }}
+    """),
+    ("user", "{text}")
+])
 
-def analyze_rfp_technical(rfp_id: int, db: Session):
+def parse_extraction(content: str) -> tuple:
+    raw_data = json.loads(clean_json_string(content))
     
-    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
-    if not rfp: return {"error": "RFP not found"}
+    # Handle formatting safety
+    items_list = raw_data.get("items", [])
+    extracted_tests = raw_data.get("tests", [])
+    
+    if not isinstance(items_list, list): items_list = [items_list]
+    if not isinstance(extracted_tests, list): extracted_tests = [str(extracted_tests)]
+    return items_list, extracted_tests
+
+def extract_requirements(rfp_text: str) -> tuple:
+    """(items, tests) extracted from the tender text. Raises on LLM or JSON errors."""
+    response = cached_invoke(extraction_prompt, llm, {"text": rfp_text}, validate=validate_json_response)
+    return parse_extraction(response.content)
 
-    rfp_text = extract_text_from_pdf(rfp.file_url)
+async def aextract_requirements(rfp_text: str, semaphore: asyncio.Semaphore) -> tuple:
+    response = await ainvoke_with_retry(extraction_prompt, {"text": rfp_text}, semaphore)
+    return parse_extraction(response.content)
+
+def matching_context(db: Session) -> tuple:
+    """(catalog snapshot, catalog_for narrowing function or None, top_k in effect)"""
+    catalog = get_catalog_snapshot(db)
+
+    catalog_for = None
+    top_k = settings.CATALOG_TOP_K if 0 < settings.CATALOG_TOP_K < len(catalog.products) else 0
+    if top_k:
+        index = catalog.search_index(db)
+        catalog_for = lambda batch: format_catalog(candidate_products(index, catalog.by_id, batch, top_k))
+    return catalog, catalog_for, top_k
+
+def match_requirements(items_list: list, db: Session) -> dict:
+    """
+    Matches extracted requirements against the catalog and scores them.
+    Returns {"line_items", "match_stats", "catalog_top_k"}.
+    """
+    catalog, catalog_for, top_k = matching_context(db)
+    products_by_id = catalog.by_id
+
+    match_stats = new_match_stats(len(items_list))
+    matches = match_items(items_list, catalog.catalog_str, match_stats, catalog_for)
+
+    keyword_index = catalog.keyword_index()
+    line_items_result = [
+        build_line_item(item, match, products_by_id, keyword_index)
+        for item, match in zip(items_list, matches)
+    ]
+    return {"line_items": line_items_result, "match_stats": match_stats, "catalog_top_k": top_k}
+
+def build_extracted_data(matched: dict, extracted_tests: list) -> dict:
+    return {
+        "line_items": matched["line_items"],
+        "required_tests": extracted_tests, 
+        "mode": "multi_sku",
+        "catalog_top_k": matched["catalog_top_k"]
+    }
+
+def run_technical_stage(rfp, db: Session) -> dict:
+    """
+    Technical analysis without persisting anything.
+    Returns {"extracted_data", "match_stats"} or {"error"}.
+    """
+    rfp_text = extract_text_prefix(rfp.file_url, EXTRACTION_CHAR_LIMIT)
     if not rfp_text: return {"error": "Could not read PDF file"}
-    
-    extraction_prompt = ChatPromptTemplate.from_messages([
-        ("system", """You are an expert technical estimator. Analyze the tender document.
-        
-        TASK 1: Extract the 'Bill of Quantities' or 'Scope of Supply'.
-        TASK 2: Extract 'Testing & Acceptance Requirements' (e.g., Type Test, Routine Test, Third Party Inspection).
-        
-        Return a JSON Object with two keys: "items" and "tests".
-        
-        Example JSON:
-        {{
-          "items": [
-             {{ "item_name": "Anticorrosive Primer", "specs": "...", "quantity": "500 L" }}
-          ],
-          "tests": ["Salt Spray Test", "High Voltage Test", "Third Party Inspection"]
-        }}
-        """),
-        ("user", "{text}")
-    ])
-    
+
     try:
-        chain = extraction_prompt | llm
-        response = chain.invoke({"text": rfp_text[:15000]})
-        raw_data = json.loads(clean_json_string(response.content))
-        
-        # Handle formatting safety
-        items_list = raw_data.get("items", [])
-        extracted_tests = raw_data.get("tests", [])
-        
-        if not isinstance(items_list, list): items_list = [items_list]
-        if not isinstance(extracted_tests, list): extracted_tests = [str(extracted_tests)]
-            
+        items_list, extracted_tests = extract_requirements(rfp_text)
     except Exception as e:
         return {"error": f"Extraction failed: {str(e)}"}
 
-    all_products = db.query(Product).all()
-    catalog_str = "\n".join([f"ID:{p.id}|Name:{p.name}|Desc:{p.description}|Specs:{p.specs}" for p in all_products])
+    matched = match_requirements(items_list, db)
+    return {
+        "extracted_data": build_extracted_data(matched, extracted_tests),
+        "match_stats": matched["match_stats"]
+    }
 
-    line_items_result = []
+def analyze_rfp_technical(rfp_id: int, db: Session):
+    
+    rfp = db.query(RFP).filter(RFP.id == rfp_id).first()
+    if not rfp: return {"error": "RFP not found"}
 
-    for item in items_list:
-        matching_prompt = ChatPromptTemplate.from_messages([
-            ("system", """Find the best single product ID for this requirement.
-            Also provide a 'semantic_score' (0-100) based on how well the technology matches.
-            Return JSON: {{ "product_id": 1, "semantic_score": 90, "reason": "..." }}"""),
-            ("user", "Requirement: {req_item}\n\nCatalog:\n{catalog}")
-        ])
-        
-        try:
-            match_res = (matching_prompt | llm).invoke({
-                "req_item": str(item),
-                "catalog": catalog_str
-            })
-            
-            match_data = json.loads(clean_json_string(match_res.content))
-            
-            product = next((p for p in all_products if p.id == match_data.get('product_id')), None)
-            
-            if product:
-                prod_text = f"{product.name} {product.description} {str(product.specs)}"
-                req_text = f"{item.get('item_name')} {item.get('specs')}"
-                
-                keyword_score = calculate_keyword_score(req_text, prod_text)
-                rule_score = 100 if match_data.get('semantic_score', 0) > 80 else 50
-                
-                ensemble_score = (
-                    (match_data.get('semantic_score', 0) * 0.5) +
-                    (keyword_score * 0.3) +
-                    (rule_score * 0.2)
-                )
-                
-                line_items_result.append({
-                    "requirement": item,
-                    "match": {
-                        "product_id": product.id,
-                        "product_name": product.name,
-                        "sku": product.sku,
-                        "reason": match_data.get('reason', 'Matched by AI'),
-                        "scores": {
-                            "ensemble": int(ensemble_score),
-                            "semantic": match_data.get('semantic_score', 0),
-                            "keyword": keyword_score,
-                            "rule": rule_score
-                        }
-                    }
-                })
-            else:
-                line_items_result.append({"requirement": item, "match": None, "error": "Product ID not found"})
-
-        except Exception as inner_e:
-            print(f"Error matching item {item}: {inner_e}")
-            line_items_result.append({"requirement": item, "match": None, "error": str(inner_e)})
-            continue
+    stage = run_technical_stage(rfp, db)
+    if "error" in stage: return stage
 
-    rfp.extracted_data = {
-        "line_items": line_items_result,
-        "required_tests": extracted_tests, 
-        "mode": "multi_sku"
-    }
+    line_items_result = stage["extracted_data"]["line_items"]
+    rfp.extracted_data = stage["extracted_data"]
     rfp.status = "Processed"
     db.commit()
 
@@ -152,5 +354,107 @@ def analyze_rfp_technical(rfp_id: int, db: Session):
         "status": "success",
         "rfp_id": rfp.id,
         "item_count": len(line_items_result),
-        "data": line_items_result
-    }
\ No newline at end of file
+        "data": line_items_result,
+        "match_stats": stage["match_stats"]
+    }
+
+def requirement_key(item) -> str:
+    """Normalized name + specs; identical requirements in different tenders share one match."""
+    return " ".join(requirement_text(item).lower().split())
+
+async def _analyze_bulk(rfps: list, db: Session) -> dict:
+    semaphore = asyncio.Semaphore(max(1, settings.MATCH_CONCURRENCY))
+
+    async def extract(rfp):
+        rfp_text = await asyncio.to_thread(extract_text_prefix, rfp.file_url, EXTRACTION_CHAR_LIMIT)
+        if not rfp_text:
+            return {"error": "Could not read PDF file"}
+        try:
+            items_list, extracted_tests = await aextract_requirements(rfp_text, semaphore)
+        except Exception as e:
+            return {"error": f"Extraction failed: {str(e)}"}
+        return {"items": items_list, "tests": extracted_tests}
+
+    extractions = await asyncio.gather(*[extract(rfp) for rfp in rfps])
+
+    # Deduplicate requirements across all tenders before matching
+    unique_items = {}
+    for extraction in extractions:
+        for item in extraction.get("items", []):
+            key = requirement_key(item)
+            if key not in unique_items:
+                unique_items[key] = (
+                    {"item_name": item.get("item_name"), "specs": item.get("specs")}
+                    if isinstance(item, dict) else item
+                )
+
+    catalog, catalog_for, top_k = matching_context(db)
+    keys = list(unique_items)
+    match_stats = new_match_stats(len(keys))
+    matches = await amatch_items(
+        [unique_items[k] for k in keys], catalog.catalog_str, match_stats, catalog_for, semaphore
+    )
+    match_by_key = dict(zip(keys, matches))
+
+    keyword_index = catalog.keyword_index()
+    results = []
+    for rfp, extraction in zip(rfps, extractions):
+        if "error" in extraction:
+            results.append((rfp, extraction))
+            continue
+        line_items = [
+            build_line_item(item, match_by_key[requirement_key(item)], catalog.by_id, keyword_index)
+            for item in extraction["items"]
+        ]
+        matched = {"line_items": line_items, "catalog_top_k": top_k}
+        results.append((rfp, build_extracted_data(matched, extraction["tests"])))
+
+    total_items = sum(len(e.get("items", [])) for e in extractions)
+    return {"results": results, "match_stats": match_stats, "total_items": total_items, "unique_items": len(keys)}
+
+def analyze_rfps_bulk(rfp_ids: list, db: Session):
+    """
+    Technical analysis for many RFPs at once. Extraction and matching calls share
+    one concurrency limit, and each distinct requirement is matched only once.
+    """
+    started = time.perf_counter()
+    rfps = db.query(RFP).filter(RFP.id.in_(rfp_ids)).all()
+    missing = sorted(set(rfp_ids) - {r.id for r in rfps})
+
+    outcome = asyncio.run(_analyze_bulk(rfps, db))
+
+    analyzed, failed = [], []
+    for rfp, result in outcome["results"]:
+        if "error" in result:
+            failed.append({"rfp_id": rfp.id, "error": result["error"]})
+            continue
+        rfp.extracted_data = result
+        rfp.status = "Processed"
+        analyzed.append({"rfp_id": rfp.id, "item_count": len(result["line_items"])})
+    db.commit()
+
+    elapsed = time.perf_counter() - started
+    match_stats = outcome["match_stats"]
+    # Calling analyze_rfp_technical in a loop costs one extraction call per RFP plus
+    # one matching call per line item (or per batch) for every RFP, with no sharing.
+    batch_size = max(1, settings.MATCH_BATCH_SIZE)
+    loop_round_trips = len(rfps) + sum(
+        -(-len(result["line_items"]) // batch_size) for _, result in outcome["results"] if "error" not in result
+    )
+
+    return {
+        "status": "success",
+        "analyzed": analyzed,
+        "failed": failed,
+        "missing": missing,
+        "stats": {
+            "rfps": len(rfps),
+            "elapsed_s": round(elapsed, 2),
+            "rfps_per_minute": round(len(rfps) / elapsed * 60, 1) if elapsed > 0 else None,
+            "total_requirements": outcome["total_items"],
+            "unique_requirements": outcome["unique_items"],
+            "round_trips": len(rfps) + match_stats["round_trips"],
+            "loop_round_trips_est": loop_round_trips,
+            "match_stats": match_stats
+        }
+    }
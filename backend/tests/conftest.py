@@ -0,0 +1,7 @@
+import os
+
+# Settings has required fields; tests never connect, so placeholders are enough
+os.environ.setdefault("POSTGRES_USER", "bidwin")
+os.environ.setdefault("POSTGRES_PASSWORD", "bidwin")
+os.environ.setdefault("POSTGRES_DB", "bidwin")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
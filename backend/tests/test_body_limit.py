@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.testclient import TestClient
+from app.core.body_limit import BodySizeLimitMiddleware, FORM_OVERHEAD_BYTES
+
+LIMIT = 1024 * 1024
+
+
+def make_app(calls: list) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(BodySizeLimitMiddleware, paths=("/upload",), max_bytes=LIMIT)
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        calls.append(file.filename)
+        return {"size": len(await file.read())}
+
+    @app.post("/other")
+    async def other(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return app
+
+
+def test_upload_within_limit_reaches_handler():
+    calls = []
+    response = TestClient(make_app(calls)).post("/upload", files={"file": ("a.pdf", b"x" * 1000)})
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 1000}
+    assert calls == ["a.pdf"]
+
+
+def test_declared_oversize_is_rejected_before_the_handler():
+    calls = []
+    body = b"x" * (LIMIT + FORM_OVERHEAD_BYTES + 1)
+    response = TestClient(make_app(calls)).post("/upload", files={"file": ("big.pdf", body)})
+
+    assert response.status_code == 413
+    assert calls == []
+
+
+def test_other_paths_are_not_limited():
+    body = b"x" * (LIMIT + FORM_OVERHEAD_BYTES + 1)
+    response = TestClient(make_app([])).post("/other", files={"file": ("big.pdf", body)})
+    assert response.status_code == 200
+
+
+def test_undeclared_body_is_cut_off_once_over_the_limit():
+    chunk = b"x" * (256 * 1024)
+    sent = []
+
+    async def receive():
+        sent.append(len(chunk))
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    async def drain(scope, receive, send):
+        while True:
+            await receive()
+
+    middleware = BodySizeLimitMiddleware(drain, paths=("/upload",), max_bytes=LIMIT)
+    scope = {"type": "http", "path": "/upload", "headers": [(b"transfer-encoding", b"chunked")]}
+
+    with pytest.raises(HTTPException) as exc:
+        asyncio.run(middleware(scope, receive, None))
+    assert exc.value.status_code == 413
+    assert sum(sent) <= LIMIT + FORM_OVERHEAD_BYTES + len(chunk)
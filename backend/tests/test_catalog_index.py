@@ -0,0 +1,20 @@
+from app.core.config import settings
+from app.services.catalog_index import benchmark_shortlist
+
+
+def test_shortlist_keeps_the_expected_product_on_seeded_catalog():
+    k = settings.CATALOG_TOP_K
+    result = benchmark_shortlist(ks=(k,))
+    shortlist = result["shortlist"][f"@{k}"]
+
+    assert result["samples"] > 0
+    assert shortlist["missed_skus"] == []
+    assert shortlist["recall"] == 1.0
+
+
+def test_shortlist_sends_less_catalog_text_than_full_matching():
+    result = benchmark_shortlist(ks=(1, 3, 8))
+    sizes = [result["shortlist"][k]["catalog_tokens_per_item"] for k in ("@1", "@3", "@8")]
+
+    assert sizes == sorted(sizes)
+    assert sizes[-1] < result["full_catalog_tokens_per_item"]
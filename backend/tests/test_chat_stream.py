@@ -0,0 +1,91 @@
+import json
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.core.config import settings
+from app.services import chat_service
+
+
+class FakeAsyncSession:
+    """Stands in for AsyncSessionLocal(): get() serves RFPs and chat sessions from dicts."""
+
+    def __init__(self, rows: dict):
+        self.rows = rows
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, model, key):
+        return self.rows.get((model, key))
+
+
+def parse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        event, data = block.split("\n", 1)
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def stream(rfp_id: int, question: str, session_id: str = None) -> list:
+    async def collect():
+        return "".join([e async for e in chat_service.stream_chat(rfp_id, question, session_id)])
+    return parse_events(asyncio.run(collect()))
+
+
+@pytest.fixture
+def chat(monkeypatch):
+    rfp = SimpleNamespace(id=1, extracted_data={"line_items": []}, file_url=None)
+    session = SimpleNamespace(id="s1", rfp_id=1, analysis="{}", summary="", turns=[], turn_count=0)
+    rows = {(chat_service.RFP, 1): rfp, (chat_service.ChatSession, "s1"): session}
+    recorded = []
+
+    async def get_session(rfp, session_id, db):
+        return session
+
+    async def build_inputs(rfp, question, db, session=None):
+        return chat_service.chat_inputs(rfp, question, "(excerpts)", session)
+
+    async def record_turn(session, question, answer, db):
+        recorded.append((session.id, question, answer))
+
+    monkeypatch.setattr(chat_service, "llm", chat_service.build_chat_llm("fake"))
+    monkeypatch.setattr(chat_service, "AsyncSessionLocal", lambda: FakeAsyncSession(rows))
+    monkeypatch.setattr(chat_service, "aget_chat_session", get_session)
+    monkeypatch.setattr(chat_service, "abuild_chat_inputs", build_inputs)
+    monkeypatch.setattr(chat_service, "arecord_turn", record_turn)
+    return SimpleNamespace(recorded=recorded)
+
+
+def test_stream_emits_tokens_then_done(chat):
+    events = stream(1, "What is the DFT?")
+
+    kinds = [kind for kind, _ in events]
+    assert kinds[-1] == "done"
+    assert set(kinds[:-1]) == {"token"}
+
+    text = "".join(data["text"] for kind, data in events if kind == "token")
+    done = events[-1][1]
+    assert text == settings.CHAT_FAKE_RESPONSE
+    assert done["response"] == text
+    assert done["session_id"] == "s1"
+    assert done["time_to_first_token_ms"] is not None
+    assert chat.recorded == [("s1", "What is the DFT?", text)]
+
+
+def test_failure_before_streaming_becomes_error_event(chat, monkeypatch):
+    async def failing_inputs(rfp, question, db, session=None):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(chat_service, "abuild_chat_inputs", failing_inputs)
+    events = stream(1, "What is the DFT?")
+
+    assert events == [("error", {"error": "Chat failed: index unavailable"})]
+    assert chat.recorded == []
+
+
+def test_unknown_rfp_becomes_error_event(chat):
+    assert stream(99, "Hello?") == [("error", {"error": "RFP not found"})]
@@ -0,0 +1,156 @@
+import re
+import pytest
+from app.services.catalog_cache import ProductRecord
+from app.services.pricing_agent import SERVICE_RATE_CARD, price_documents
+
+
+class FakeCatalog:
+    def __init__(self, products):
+        self.by_id = {p.id: p for p in products}
+
+
+CATALOG = FakeCatalog([
+    ProductRecord(1, "CAB-XLPE-3C-95", "XLPE Cable 3C 95sqmm", "", 845.5, {}),
+    ProductRecord(2, "CAB-PVC-4C-16", "PVC Cable 4C 16sqmm", "", 212.35, {}),
+    ProductRecord(3, "TRF-DIST-250", "Distribution Transformer 250kVA", "", 412999.99, {}),
+])
+
+
+def line(item_name, quantity, product_id=None):
+    return {
+        "requirement": {"item_name": item_name, "quantity": quantity},
+        "match": {"product_id": product_id} if product_id is not None else None,
+    }
+
+
+def reference_pricing(data: dict, catalog) -> dict:
+    """The per-line loop calculate_pricing used before vectorization."""
+    commercial_lines = []
+    for item in data.get("line_items", []):
+        match = item.get("match")
+        if not match: continue
+
+        product = catalog.by_id.get(match["product_id"])
+        if not product: continue
+
+        base_price = product.base_price
+        qty_str = str(item["requirement"].get("quantity", "1"))
+        try:
+            nums = re.findall(r"[-+]?\d*\.\d+|\d+", qty_str)
+            qty = float(nums[0]) if nums else 1.0
+        except:
+            qty = 1.0
+
+        line_base = base_price * qty
+        logistics = line_base * 0.05
+        margin = line_base * 0.20
+        gst = (line_base + logistics + margin) * 0.18
+        line_total = line_base + logistics + margin + gst
+
+        commercial_lines.append({
+            "item_name": item["requirement"]["item_name"],
+            "sku": product.sku,
+            "qty": qty,
+            "unit_price": base_price,
+            "line_total": round(line_total, 2),
+            "breakdown": {
+                "base": round(line_base, 2),
+                "logistics": round(logistics, 2),
+                "margin": round(margin, 2),
+                "gst": round(gst, 2)
+            }
+        })
+
+    extracted_tests = data.get("required_tests", [])
+    if isinstance(extracted_tests, str):
+        extracted_tests = [extracted_tests]
+
+    total_service_cost = 0.0
+    for test_name in extracted_tests:
+        cost = 0.0
+        for key, rate in SERVICE_RATE_CARD.items():
+            if key.lower() in str(test_name).lower():
+                cost = rate
+                break
+        if cost == 0.0:
+            cost = 5000.0
+        total_service_cost += cost
+
+    grand_total_products = sum(l["line_total"] for l in commercial_lines)
+    return {
+        "lines": commercial_lines,
+        "product_total": round(grand_total_products, 2),
+        "service_total": round(total_service_cost, 2),
+        "grand_total_inr": round(grand_total_products + total_service_cost, 2),
+    }
+
+
+# Test names are ones the old substring loop and the rate-card matcher price the same way
+DOCUMENTS = {
+    "mixed": {
+        "line_items": [
+            line("XLPE cable", "1200 meters", 1),
+            line("PVC cable", "37.5 km", 2),
+            line("Transformer", "3 Nos", 3),
+            line("Unmatched item", "10"),
+        ],
+        "required_tests": ["Type Test", "Routine Test", "High Voltage Test", "Vibration test"],
+    },
+    "empty_services": {
+        "line_items": [line("XLPE cable", "250", 1), line("PVC cable", "7", 2)],
+        "required_tests": [],
+    },
+    "no_services_key": {
+        "line_items": [line("Transformer", "2", 3)],
+    },
+    "single_service_string": {
+        "line_items": [line("PVC cable", "12", 2)],
+        "required_tests": "Salt Spray Test",
+    },
+    "zero_quantities": {
+        "line_items": [line("XLPE cable", "0", 1), line("PVC cable", "0.0 m", 2), line("Transformer", "1", 3)],
+        "required_tests": ["Type Test"],
+    },
+    "missing_skus": {
+        "line_items": [line("Retired product", "5", 99), line("Another", "1", 404), line("XLPE cable", "3", 1)],
+        "required_tests": ["Routine Test"],
+    },
+    "no_parsable_quantity": {
+        "line_items": [line("XLPE cable", "as required", 1), line("PVC cable", None, 2)],
+    },
+    "empty": {"line_items": []},
+}
+
+
+def assert_same_pricing(commercial: dict, expected: dict):
+    assert commercial["lines"] == expected["lines"]
+    assert commercial["product_total"] == expected["product_total"]
+    assert commercial["service_total"] == expected["service_total"]
+    assert commercial["grand_total_inr"] == expected["grand_total_inr"]
+
+
+@pytest.mark.parametrize("name", DOCUMENTS)
+def test_price_documents_matches_per_line_loop(name):
+    data = DOCUMENTS[name]
+    [commercial] = price_documents([data], CATALOG)
+    assert_same_pricing(commercial, reference_pricing(data, CATALOG))
+
+
+def test_price_documents_batch_matches_one_by_one():
+    documents = list(DOCUMENTS.values())
+    commercials = price_documents(documents, CATALOG)
+    assert len(commercials) == len(documents)
+    for data, commercial in zip(documents, commercials):
+        assert_same_pricing(commercial, reference_pricing(data, CATALOG))
+
+
+def test_price_documents_with_no_documents():
+    assert price_documents([], CATALOG) == []
+
+
+def test_missing_skus_and_zero_quantities_are_handled():
+    [commercial] = price_documents([DOCUMENTS["missing_skus"]], CATALOG)
+    assert [l["sku"] for l in commercial["lines"]] == ["CAB-XLPE-3C-95"]
+
+    [commercial] = price_documents([DOCUMENTS["zero_quantities"]], CATALOG)
+    assert [l["line_total"] for l in commercial["lines"][:2]] == [0.0, 0.0]
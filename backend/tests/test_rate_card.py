@@ -0,0 +1,92 @@
+import random
+import pytest
+from app.services.rate_card import RateCardMatcher
+from app.services import pricing_agent
+from app.services.pricing_agent import SERVICE_RATE_CARD, SERVICE_SYNONYMS
+
+MATCHER = RateCardMatcher(SERVICE_RATE_CARD, SERVICE_SYNONYMS)
+
+
+def substring_loop(test_name: str):
+    """The insertion-order substring scan calculate_pricing used before the automaton."""
+    for key in SERVICE_RATE_CARD:
+        if key.lower() in str(test_name).lower():
+            return key
+    return None
+
+
+FRAGMENTS = [
+    "type test", "routine test", "acceptance test", "high voltage test", "salt spray test",
+    "third party inspection", "factory acceptance test", "fat", "tpi", "hv test",
+    "type", "test", "voltage", "salt", "factory", "inspection", "fatigue", "accept",
+    " ", " and ", "-", "(", ")", "as per is 2026", "x", "@",
+]
+
+
+def generated_names(count: int = 2000) -> list:
+    rng = random.Random(42)
+    names = list(SERVICE_RATE_CARD) + [a for aliases in SERVICE_SYNONYMS.values() for a in aliases]
+    for _ in range(count):
+        parts = rng.choices(FRAGMENTS, k=rng.randint(1, 5))
+        name = "".join(parts)
+        names.append(name.upper() if rng.random() < 0.3 else name)
+    return names
+
+
+@pytest.mark.parametrize("name", generated_names())
+def test_first_mode_matches_the_substring_loop(name):
+    assert MATCHER.match(name, "first") == substring_loop(name)
+
+
+def test_longest_match_prefers_the_most_specific_service():
+    assert MATCHER.match("Factory Acceptance Test", "longest") == "Factory Acceptance Test"
+    assert MATCHER.match("Factory Acceptance Test", "first") == "Acceptance Test"
+    assert MATCHER.match("Routine test and High Voltage Test", "longest") == "High Voltage Test"
+
+
+def test_longest_match_ties_go_to_rate_card_order():
+    matcher = RateCardMatcher({"Alpha Test": 1.0, "Gamma Test": 2.0, "Beta": 3.0})
+    assert matcher.match("gamma test, then alpha test") == "Alpha Test"
+    assert matcher.match("alpha test, then gamma test") == "Alpha Test"
+    assert matcher.match("beta only") == "Beta"
+
+
+def test_overlapping_patterns_are_all_found():
+    matcher = RateCardMatcher({"he": 1.0, "she": 2.0, "his": 3.0, "hers": 4.0})
+    assert matcher.find_all("ushers") == {"he", "she", "hers"}
+    assert matcher.match("ushers") == "hers"
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("TPI by Lloyds", "Third Party Inspection"),
+    ("Third-Party Inspection at works", "Third Party Inspection"),
+    ("HV Test on each drum", "High Voltage Test"),
+    ("Salt Fog Test 1000 h", "Salt Spray Test"),
+    ("Factory Acceptance Testing", "Factory Acceptance Test"),
+])
+def test_synonyms_resolve_to_their_rate_card_key(name, expected):
+    assert MATCHER.match(name, "longest") == expected
+
+
+@pytest.mark.parametrize("name", ["TPI by Lloyds", "HV Test on each drum", "Salt Fog Test 1000 h"])
+def test_first_mode_ignores_synonyms(name):
+    assert MATCHER.match(name, "first") is None
+
+
+def test_synonyms_for_unknown_services_are_skipped():
+    matcher = RateCardMatcher({"Type Test": 1.0}, {"Missing Service": ["MS"]})
+    assert matcher.match("ms test") is None
+
+
+def test_unmatched_names_return_none():
+    assert MATCHER.match("Vibration analysis") is None
+    assert MATCHER.match("") is None
+
+
+@pytest.mark.parametrize("mode, cost", [("longest", 10000.0), ("first", 5000.0)])
+def test_factory_acceptance_test_pricing_per_mode(monkeypatch, mode, cost):
+    # "longest" (the default) prices FAT as its own service; "first" keeps the old price
+    monkeypatch.setattr(pricing_agent.settings, "RATE_CARD_MATCH_MODE", mode)
+    lines, total = pricing_agent.price_services({"required_tests": ["Factory Acceptance Test"]})
+    assert total == cost
+    assert lines[0]["cost"] == cost
@@ -0,0 +1,43 @@
+import pytest
+from app.services.catalog_cache import ProductRecord
+from app.services.catalog_index import KeywordIndex
+from app.services.technical_agent import build_line_item
+
+PRODUCTS = {
+    1: ProductRecord(1, "AP-IND-001", "Apcodur 530", "High build epoxy coating", 450.0, {"base": "Epoxy"}),
+    2: ProductRecord(2, "AP-IND-003", "Apcothane CF 675", "Polyurethane topcoat", 850.0, {"base": "PU"}),
+}
+KEYWORDS = KeywordIndex(list(PRODUCTS.values()))
+ITEM = {"item_name": "Epoxy coating", "specs": "High build", "quantity": "100 L"}
+
+
+def build(match_data):
+    return build_line_item(ITEM, match_data, PRODUCTS, KEYWORDS)
+
+
+@pytest.mark.parametrize("raw, expected", [(90, 90), ("90", 90), ("72.5", 72.5), (None, 0)])
+def test_semantic_score_is_coerced_to_a_number(raw, expected):
+    line = build({"product_id": 1, "semantic_score": raw, "reason": "Epoxy match"})
+
+    assert line["match"]["sku"] == "AP-IND-001"
+    assert line["match"]["scores"]["semantic"] == expected
+    assert line["match"]["scores"]["rule"] == (100 if expected > 80 else 50)
+
+
+@pytest.mark.parametrize("match_data", [
+    {"product_id": 1, "semantic_score": "high"},
+    {"product_id": 1, "semantic_score": [90]},
+    {"product_id": [1], "semantic_score": 90},
+    ["not", "a", "dict"],
+    ValueError("LLM timed out"),
+])
+def test_malformed_replies_fail_only_their_line_item(match_data):
+    line = build(match_data)
+
+    assert line["requirement"] == ITEM
+    assert line["match"] is None
+    assert line["error"]
+
+
+def test_unknown_product_is_reported():
+    assert build({"product_id": 99, "semantic_score": 90})["error"] == "Product ID not found"
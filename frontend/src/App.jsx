@@ -17,13 +17,29 @@ function cn(...inputs) {
 const BASE_URL = 'http://localhost:8000'; 
 
 const api = {
-  // Fetch list of all RFPs
-  rfps: async () => {
+  // Fetch one page of RFPs (newest first); pass nextCursor back to get the following page
+  rfps: async (cursor = null, limit = 50) => {
     try {
-      const res = await fetch(`${BASE_URL}/api/agents/sales/rfps`);
+      const params = new URLSearchParams({ limit });
+      if (cursor) params.set('cursor', cursor);
+      const res = await fetch(`${BASE_URL}/api/agents/sales/rfps?${params}`);
       if (!res.ok) throw new Error('Failed to fetch RFPs');
+      return { items: await res.json(), nextCursor: res.headers.get('X-Next-Cursor') };
+    } catch (e) { console.error(e); return { items: [], nextCursor: null }; }
+  },
+  // RFP totals per status
+  counts: async () => {
+    try {
+      const res = await fetch(`${BASE_URL}/api/agents/sales/rfps/counts`);
+      if (!res.ok) throw new Error('Failed to fetch counts');
       return await res.json();
-    } catch (e) { console.error(e); return []; }
+    } catch (e) { console.error(e); return { total: 0, by_status: {} }; }
+  },
+  // Fetch one RFP including its analysis
+  rfp: async (id) => {
+    const res = await fetch(`${BASE_URL}/api/agents/sales/rfps/${id}`);
+    if (!res.ok) return null;
+    return await res.json();
   },
   // Trigger Sales Agent Scan
   scan: async () => {
@@ -50,11 +66,11 @@ const api = {
     await fetch(`http://localhost:5678/webhook/auto-process?id=${id}`, { mode: 'no-cors' });
   },
 
-   chat: async (id, question) => {
+   chat: async (id, question, sessionId) => {
     const res = await fetch(`${BASE_URL}/api/agents/main/${id}/chat`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ question })
+      body: JSON.stringify({ question, session_id: sessionId })
     });
     return await res.json();
   },
@@ -185,16 +201,15 @@ const Dashboard = () => {
   const [stats, setStats] = useState({ total: 0, new: 0, processing: 0, ready: 0 });
 
   const loadData = async () => {
-    const data = await api.rfps();
-    if(Array.isArray(data)) {
-      setRecentRfps(data.slice(0, 4));
-      setStats({
-        total: data.length,
-        new: data.filter(r => r.status === 'New').length,
-        processing: data.filter(r => ['Processed', 'Pricing Complete'].includes(r.status)).length,
-        ready: data.filter(r => r.status === 'Ready to Submit').length
-      });
-    }
+    const [page, counts] = await Promise.all([api.rfps(null, 4), api.counts()]);
+    const byStatus = counts.by_status || {};
+    setRecentRfps(page.items);
+    setStats({
+      total: counts.total || 0,
+      new: byStatus['New'] || 0,
+      processing: (byStatus['Processed'] || 0) + (byStatus['Pricing Complete'] || 0),
+      ready: byStatus['Ready to Submit'] || 0
+    });
   };
 
   useEffect(() => { loadData(); }, []);
@@ -272,20 +287,30 @@ const Dashboard = () => {
 const RfpList = () => {
   const navigate = useNavigate();
   const [rfps, setRfps] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
-  useEffect(() => {
-    const fetchData = async () => {
-      const data = await api.rfps();
-      setRfps(Array.isArray(data) ? data : []);
-    };
-    fetchData();
-  }, []);
+  const loadFirstPage = async () => {
+    const page = await api.rfps();
+    setRfps(page.items);
+    setNextCursor(page.nextCursor);
+  };
+
+  const loadMore = async () => {
+    setLoadingMore(true);
+    const page = await api.rfps(nextCursor);
+    setRfps(prev => [...prev, ...page.items]);
+    setNextCursor(page.nextCursor);
+    setLoadingMore(false);
+  };
+
+  useEffect(() => { loadFirstPage(); }, []);
 
   return (
     <div className="p-8 bg-slate-100 min-h-screen">
       <div className="flex justify-between items-end mb-8">
         <h1 className="text-5xl font-black uppercase tracking-tighter text-slate-900">All Tenders</h1>
-        <NeoButton variant="secondary" icon={RefreshCw} onClick={async () => setRfps(await api.rfps())}>Refresh</NeoButton>
+        <NeoButton variant="secondary" icon={RefreshCw} onClick={loadFirstPage}>Refresh</NeoButton>
       </div>
 
       <div className="bg-white border-4 border-black shadow-[8px_8px_0px_0px_rgba(0,0,0,1)] overflow-hidden">
@@ -316,6 +341,11 @@ const RfpList = () => {
           </tbody>
         </table>
       </div>
+      {nextCursor && (
+        <div className="mt-6 flex justify-center">
+          <NeoButton variant="secondary" loading={loadingMore} onClick={loadMore}>Load More</NeoButton>
+        </div>
+      )}
     </div>
   );
 };
@@ -333,6 +363,8 @@ const RfpDetail = () => {
   ]);
   const [chatInput, setChatInput] = useState('');
   const [chatLoading, setChatLoading] = useState(false);
+  // Server-side chat session, reused for every question on this RFP
+  const [chatSessionId, setChatSessionId] = useState(null);
 
   const handleSendChat = async () => {
     if (!chatInput.trim()) return;
@@ -344,7 +376,8 @@ const RfpDetail = () => {
     setChatLoading(true);
 
     try {
-      const res = await api.chat(id, userMsg.text);
+      const res = await api.chat(id, userMsg.text, chatSessionId);
+      if (res.session_id) setChatSessionId(res.session_id);
       // Add Bot Message
       setChatHistory(prev => [...prev, { role: 'bot', text: res.response || "Sorry, I couldn't process that." }]);
     } catch (e) {
@@ -355,15 +388,14 @@ const RfpDetail = () => {
 
   // Fetch details
   const fetchDetails = async () => {
-    const all = await api.rfps();
-    const found = all.find(r => r.id === parseInt(id));
+    const found = await api.rfp(id);
     if(found) {
         setRfp(found);
         if(found.status === 'Ready to Submit') setIsPolling(false);
     }
   };
 
-  useEffect(() => { fetchDetails(); }, [id]);
+  useEffect(() => { fetchDetails(); setChatSessionId(null); }, [id]);
 
   // Polling Logic
   useEffect(() => {
@@ -735,6 +767,9 @@ const UploadPage = () => {
       if (res.status === 'success') {
         alert("✅ Upload Successful! Redirecting to Pipeline...");
         navigate(`/rfps/${res.rfp_id}`); 
+      } else if (res.status === 'duplicate') {
+        alert("ℹ️ This file was already uploaded. Opening the existing RFP...");
+        navigate(`/rfps/${res.rfp_id}`);
       }
     } catch (err) {
       alert("Upload Failed. Check console.");